@@ -1,5 +1,8 @@
-from typing import List, Callable
+from collections import OrderedDict
+from copy import copy
+from typing import List, Callable, Tuple, Union
 import numpy as np
+import pandas as pd
 from joblib import Parallel, delayed
 from sklearn.utils.validation import check_X_y
 from sklearn.ensemble import (
@@ -9,13 +12,18 @@ from sklearn.ensemble import (
     RandomForestClassifier,
     AdaBoostRegressor,
     AdaBoostClassifier,
+    HistGradientBoostingRegressor,
+    HistGradientBoostingClassifier,
 )
+from sklearn.multioutput import MultiOutputRegressor, MultiOutputClassifier
 from . import covering_tools as ct
 from . import functions as f
 from .cell import BaseCell
+from .pool_cache import RulePoolCache
+from ruleskit import HyperrectangleCondition
 from ruleskit import RuleSet
 from ruleskit import RegressionRule
-from ruleskit import extract_rules_from_tree
+from ruleskit import Activation
 
 
 def eval_rules(rule: RegressionRule, y: np.ndarray, xs: np.ndarray):
@@ -34,6 +42,213 @@ def eval_rules(rule: RegressionRule, y: np.ndarray, xs: np.ndarray):
     return rule
 
 
+def calc_stats(act: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Returns the sufficient statistics (count, sum, sum of squares)
+    of y on the activated points.
+    """
+    act = np.asarray(act, dtype=float)
+    return np.array([act.sum(), np.dot(act, y), np.dot(act, y ** 2)])
+
+
+def calc_targets_stats(acts: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """
+    Returns the sufficient statistics of the k targets on the activated
+    points of each rule, of shape (n_rules, 3, k), with a single product
+    of the activation matrix by the matrix [1, y, y ** 2].
+    """
+    ones = np.ones((ys.shape[0], 1))
+    stats = np.dot(np.asarray(acts, dtype=float), np.hstack([ones, ys, ys ** 2]))
+    nb_targets = ys.shape[1]
+    return np.stack(
+        [
+            np.repeat(stats[:, :1], nb_targets, axis=1),
+            stats[:, 1: nb_targets + 1],
+            stats[:, nb_targets + 1:],
+        ],
+        axis=1,
+    )
+
+
+def update_rule(rule: RegressionRule, act: np.ndarray, stats: np.ndarray):
+    """
+    Sets the activation, prediction and std of a rule
+    from its sufficient statistics.
+    """
+    # noinspection PyProtectedMember
+    rule._activation = Activation(np.asarray(act, dtype=int))
+    set_rule_stats(rule, stats)
+
+
+def set_rule_stats(rule: RegressionRule, stats: np.ndarray):
+    """
+    Sets the prediction and std of a rule from its sufficient statistics.
+    """
+    count, y_sum, y_sum2 = stats
+    if count > 0:
+        rule._prediction = y_sum / count
+        rule._std = np.sqrt(max(0, y_sum2 / count - rule._prediction ** 2))
+    else:
+        rule._prediction = np.nan
+        rule._std = np.nan
+
+
+def eval_rules_chunk(rules_list: List[RegressionRule], y: np.ndarray, xs: np.ndarray):
+    return [eval_rules(rule, y, xs) for rule in rules_list]
+
+
+def eval_binned_rules_chunk(
+    rules_list: List[RegressionRule],
+    y: np.ndarray,
+    binned: np.ndarray,
+    bins: ct.FeatureBins,
+):
+    for rule in rules_list:
+        act = bins.evaluate(rule, binned)
+        update_rule(rule, act, calc_stats(act, y))
+    return rules_list
+
+
+def eval_targets_chunk(
+    rules_list: List[RegressionRule],
+    ys: np.ndarray,
+    xs: np.ndarray,
+    bins: ct.FeatureBins = None,
+):
+    """
+    Evaluates the activations of the rules once, and their statistics
+    on all the targets. The rules get the statistics of the first target.
+    """
+    acts = ct.eval_activations(rules_list, xs, bins)
+    stats = calc_targets_stats(acts, ys)
+    for rule, act, rule_stats in zip(rules_list, acts, stats):
+        update_rule(rule, act, rule_stats[:, 0])
+    return rules_list, stats
+
+
+def eval_rows_block(
+    rules_list: List[RegressionRule],
+    ys: np.ndarray,
+    xs: np.ndarray,
+    bins: ct.FeatureBins = None,
+):
+    """
+    Evaluates all the rules on a block of rows. Returns the partial
+    sufficient statistics of the targets ys, of shape (n_rules, 3, k),
+    and the activations of the block packed by rule.
+    """
+    acts = ct.eval_activations(rules_list, xs, bins)
+    acts = np.asarray(acts, dtype=bool).reshape(len(rules_list), xs.shape[0])
+    return calc_targets_stats(acts, ys), np.packbits(acts, axis=1)
+
+
+def check_data(xs: np.ndarray, y: np.ndarray):
+    xs, y = check_X_y(
+        xs,
+        y,
+        ensure_min_samples=10,
+        accept_sparse=True,
+        force_all_finite="allow-nan",
+        y_numeric=True,
+        multi_output=True,
+    )
+    if y.ndim == 2 and y.shape[1] == 1:
+        y = y.ravel()
+    return xs, y
+
+
+class FitSession:
+    """
+    Data validated and preprocessed once, to be shared by several fits of
+    CA on the same (X, y), e.g. with different generators or parameters.
+
+    Besides the validated data and the range of each feature, it caches
+    the evaluated rules, keyed by their bounds, and the activations of the
+    elementary conditions (a feature in a closed interval) from which new
+    rules are evaluated. A condition is evaluated from the sorted values of
+    the feature: its rows are found by two binary searches, but its
+    activation is still a dense vector of n_samples, cached packed.
+    """
+
+    def __init__(
+        self,
+        xs: np.ndarray,
+        y: np.ndarray,
+        features: List[str] = None,
+        max_conditions: int = 4096,
+    ):
+        """
+        Parameters
+        ----------
+        xs: features matrix
+        y: variable of interest, of shape (n_samples,) or (n_samples, n_outputs)
+        features: name of the features with the same order
+        max_conditions: maximal number of cached conditions activations,
+                        the least recently used being dropped
+        """
+        self.xs, self.y = check_data(xs, y)
+        self.features = features
+        self.max_conditions = max_conditions
+        self.x_min = self.xs.min(axis=0)
+        self.x_max = self.xs.max(axis=0)
+        self.n_samples = self.xs.shape[0]
+        self._ranks = None
+        self._sorted_xs = None
+        self.conditions = OrderedDict()
+        self.rules = {}
+
+    @property
+    def ranks(self) -> np.ndarray:
+        # Missing values are sorted last
+        if self._ranks is None:
+            self._ranks = np.argsort(self.xs, axis=0, kind="stable")
+            self._sorted_xs = np.take_along_axis(self.xs, self._ranks, axis=0)
+        return self._ranks
+
+    def eval_condition(self, j: int, low: float, high: float) -> np.ndarray:
+        key = (j, low, high)
+        if key in self.conditions:
+            self.conditions.move_to_end(key)
+            return np.unpackbits(self.conditions[key], count=self.n_samples).astype(bool)
+        ranks = self.ranks[:, j]
+        values = self._sorted_xs[:, j]
+        start = np.searchsorted(values, low, side="left")
+        stop = np.searchsorted(values, high, side="right")
+        act = np.zeros(self.n_samples, dtype=bool)
+        act[ranks[start:stop]] = True
+        self.conditions[key] = np.packbits(act)
+        if len(self.conditions) > self.max_conditions:
+            self.conditions.popitem(last=False)
+        return act
+
+    @staticmethod
+    def get_key(rule: RegressionRule) -> Tuple:
+        condition = rule.condition
+        return (
+            tuple(condition.features_indexes),
+            tuple(condition.bmins),
+            tuple(condition.bmaxs),
+        )
+
+    def eval_rule(self, rule: RegressionRule) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the activation of a rule and its sufficient statistics,
+        of shape (3,) or (3, n_outputs).
+        """
+        key = self.get_key(rule)
+        if key not in self.rules:
+            act = np.ones(self.n_samples, dtype=bool)
+            for j, low, high in zip(*key):
+                act &= self.eval_condition(j, low, high)
+            if self.y.ndim == 1:
+                stats = calc_stats(act, self.y)
+            else:
+                stats = calc_targets_stats(act[None, :], self.y)[0]
+            self.rules[key] = (np.packbits(act), stats)
+        packed, stats = self.rules[key]
+        return np.unpackbits(packed, count=self.n_samples).astype(int), stats
+
+
 class CA:
     """
     Covering Algorithm class
@@ -52,6 +267,18 @@ class CA:
         seed: int = None,
         mode: str = "r",
         generator_func: Callable = None,
+        eval_mode: str = "exact",
+        sample_size: int = None,
+        confidence: float = 0.99,
+        chunks_per_job: int = 4,
+        quantize: bool = False,
+        compact: bool = False,
+        sketch_size: int = None,
+        adaptive: bool = False,
+        min_new_rate: float = 0.05,
+        shard_by: str = "rules",
+        cache_path: str = None,
+        cache_size: float = 2 ** 30,
     ):
         """
         Parameters
@@ -65,6 +292,30 @@ class CA:
         n_jobs
         seed
         generator_func
+        eval_mode: "exact" to evaluate every rule on the whole data, or "sampled"
+                   to first discard on a sample of rows the rules clearly rejected
+        sample_size: number of sampled rows for the "sampled" mode
+        confidence: probability that the sampled bounds hold
+        chunks_per_job: number of parallel tasks per worker
+        quantize: to evaluate the rules on integer codes of the features,
+                  binned on the bounds of the rules
+        compact: to free after fit the memory not needed for prediction
+        sketch_size: size of the bottom-k sketches of the activations used to
+                     approximate the union tests of the rules selection, for
+                     very large data. By default the tests are exact
+        adaptive: to grow the trees by batches and stop the generator when
+                  the rules of a batch are mostly redundant
+        min_new_rate: in adaptive mode, minimal fraction of new eligible rules
+                      (not seen before, of length at most lmax, with enough
+                      coverage and significant) among the rules of a batch
+                      to go on generating trees
+        cache_path: directory of an on-disk cache of the evaluated rules,
+                    reused by the fits on the same data with the same
+                    generator configuration. By default there is no cache
+        cache_size: maximal size of the cache in bytes
+        shard_by: "rules" to evaluate the rules in parallel by chunks of
+                  rules, or "rows" to give each task a block of rows on which
+                  it evaluates all the rules, for tall data
         """
         BaseCell.instances = []
 
@@ -79,13 +330,42 @@ class CA:
         self.mode = mode
         self.subsample = subsample
         self.generator = generator_func
+        self.eval_mode = eval_mode
+        self.sample_size = sample_size
+        self.confidence = confidence
+        self.chunks_per_job = chunks_per_job
+        self.quantize = quantize
+        self.compact_mode = compact
+        self.sketch_size = sketch_size
+        self.adaptive = adaptive
+        self.min_new_rate = min_new_rate
+        self.cache_path = cache_path
+        self.cache_size = cache_size
+        self.shard_by = shard_by
         self.rules_generator = None
         self.features = []
         self.rules_list = []
         self.selected_rs = RuleSet([])
         self.y = None
+        self.rules_stats = None
+        self.bins = None
+        # Bins and codes of the training features, computed once per fit
+        self.binned_xs = None
+        self.prediction_index = None
+        self.rules_summary = None
+        self.truncation = {}
+        self.n_targets = None
+        self.session = None
+        self.new_rules_rates = []
 
-    def fit(self, xs: np.ndarray, y: np.ndarray, features: List[str] = None):
+    def fit(
+        self,
+        xs: Union[np.ndarray, FitSession],
+        y: np.ndarray = None,
+        features: List[str] = None,
+        time_budget: float = None,
+        memory_budget: float = None,
+    ):
         """
         Build a covering algorithm from the set (X, y).
         Parameters
@@ -94,69 +374,653 @@ class CA:
             The training input samples. Internally, its dtype will be converted
             to ``dtype=np.float32``. If a sparse matrix is provided, it will be
             converted into a sparse ``csc_matrix``.
+            It can also be a FitSession holding (X, y), then y is not given,
+            and the data preprocessing and evaluated rules of the session
+            are reused.
         y : array-like of shape (n_samples,) or (n_samples, n_outputs)
             The target values (class labels in classification, real numbers in
-            regression).
+            regression). With several targets, a single pool of rules is
+            generated and evaluated, and a covering is selected per target:
+            selected_rs and prediction_index are then lists, and predict
+            returns one column per target.
         features : array-like of shape (n_features,), default=None
                    Name of the features with the same order
+        time_budget : float, default=None
+                      Maximal fit duration in seconds. When it is nearly spent,
+                      no more trees are generated nor rules evaluated, and the
+                      covering is selected among the rules evaluated so far.
+                      What was cut is recorded in ``truncation``.
+        memory_budget : float, default=None
+                        Maximal peak resident memory of the process in bytes,
+                        handled as time_budget.
         Returns
         -------
         self : object
         """
-        xs, y = check_X_y(
-            xs,
-            y,
-            ensure_min_samples=10,
-            accept_sparse=True,
-            force_all_finite="allow-nan",
-            y_numeric=True,
-        )
+        if isinstance(xs, FitSession):
+            self.session = xs
+            xs, y = self.session.xs, self.session.y
+            if features is None:
+                features = self.session.features
+            x_min, x_max = self.session.x_min, self.session.x_max
+        else:
+            self.session = None
+            xs, y = check_data(xs, y)
+            x_min = xs.min(axis=0)
+            x_max = xs.max(axis=0)
+        self.n_targets = y.shape[1] if y.ndim == 2 else None
+        budget = f.Budget(time_budget, memory_budget)
+        self.truncation = {}
         self.y = y
+        self.rules_list = []
+        self.rules_stats = None
+        self.bins = None
+        self.binned_xs = None
+        if self.eval_mode not in ["exact", "sampled"]:
+            raise ValueError("eval_mode must be 'exact' or 'sampled'.")
+        if self.shard_by not in ["rules", "rows"]:
+            raise ValueError("shard_by must be 'rules' or 'rows'.")
+        if self.n_targets is not None and self.eval_mode == "sampled":
+            raise ValueError("eval_mode 'sampled' requires a single target.")
+        if self.adaptive and (
+            self.n_targets is not None
+            or self.quantize
+            or self.generator in [AdaBoostRegressor, AdaBoostClassifier]
+        ):
+            raise ValueError(
+                "The adaptive mode requires a single target, no quantization "
+                "and a generator with warm start."
+            )
 
-        x_min = xs.min(axis=0)
-        x_max = xs.max(axis=0)
         if features is None:
             self.features = ["feature_" + str(col) for col in range(0, xs.shape[1])]
         else:
             self.features = features
         nb_estimator = int(np.ceil(self.max_rules / self.tree_size))
 
-        self.set_rule_generator(nb_estimator, self.subsample, self.mode)
-        self.rules_generator.fit(xs, y)
-        self.extract_rules(x_min, x_max)
-        self.eval_rules(xs, y)
+        pool = None
+        cache = None
+        # Truncated pools depend on the duration of the fit, they are not cached
+        if self.cache_path is not None and not budget.is_active:
+            cache = RulePoolCache(self.cache_path, self.cache_size)
+            cache_key = cache.get_key(xs, y, self.get_cache_params())
+            pool = cache.load(cache_key)
+
+        if pool is not None:
+            # The generator is not stored in the cache
+            self.rules_generator = None
+            self.load_pool(pool)
+        else:
+            self.set_rule_generator(nb_estimator, self.subsample, self.mode)
+            self.generate_rules(xs, y, x_min, x_max, nb_estimator, budget)
+            if cache is not None:
+                cache.store(cache_key, self.dump_pool(len(y)))
         self.select_rules(y)
+        # The model does not keep the data of the session, nor its codes
+        self.session = None
+        self.binned_xs = None
+        if self.compact_mode:
+            self.compact()
 
         return self
 
-    def extract_rules(self, x_min: List[float], x_max: List[float]):
+    def generate_rules(
+        self,
+        xs: np.ndarray,
+        y: np.ndarray,
+        x_min: List[float],
+        x_max: List[float],
+        nb_estimator: int,
+        budget: f.Budget,
+    ):
+        if self.adaptive:
+            self.fit_adaptive(xs, y, x_min, x_max, nb_estimator, budget)
+            return
+        self.fit_generator(xs, y, nb_estimator, budget)
+        self.extract_rules(x_min, x_max)
+        if self.eval_mode == "sampled":
+            self.rules_list = self.screen_rules(self.rules_list, xs, y)
+        if self.quantize and self.bins is None:
+            self.set_bins(xs.shape[1])
+        if budget.is_active:
+            self.eval_rules_with_budget(xs, y, budget)
+        else:
+            self.eval_rules(xs, y)
+
+    def get_cache_params(self) -> dict:
+        """
+        Returns the parameters the evaluated rules depend on.
+        """
+        params = {
+            "generator": "default" if self.generator is None else self.generator.__name__,
+            "mode": self.mode,
+            "tree_size": self.tree_size,
+            "max_rules": self.max_rules,
+            "learning_rate": self.learning_rate,
+            "subsample": self.subsample,
+            "seed": self.seed,
+            "features": [str(feature) for feature in self.features],
+            "eval_mode": self.eval_mode,
+            "quantize": self.quantize,
+            "adaptive": self.adaptive,
+        }
+        if self.eval_mode == "sampled":
+            params.update(sample_size=self.sample_size, confidence=self.confidence)
+        if self.eval_mode == "sampled" or self.adaptive:
+            params.update(alpha=self.alpha, lmax=self.l_max)
+        if self.adaptive:
+            params.update(min_new_rate=self.min_new_rate)
+        return params
+
+    def dump_pool(self, n_samples: int) -> dict:
+        """
+        Returns the evaluated rules as arrays, to be stored in the cache.
+        """
+        conditions = [rule.condition for rule in self.rules_list]
+        pool = {
+            "offsets": np.cumsum([0] + [len(c.features_indexes) for c in conditions]),
+            "features_indexes": np.array(
+                [j for c in conditions for j in c.features_indexes], dtype=int
+            ),
+            "bmins": np.array([b for c in conditions for b in c.bmins], dtype=float),
+            "bmaxs": np.array([b for c in conditions for b in c.bmaxs], dtype=float),
+            "predictions": np.array([rule.prediction for rule in self.rules_list], dtype=float),
+            "stds": np.array([rule.std for rule in self.rules_list], dtype=float),
+            "activations": np.packbits(
+                np.array([rule.activation for rule in self.rules_list], dtype=bool).reshape(
+                    len(self.rules_list), n_samples
+                ),
+                axis=1,
+            ),
+            "n_samples": np.array(n_samples),
+            "bins": self.bins,
+        }
+        if self.rules_stats is not None:
+            pool["rules_stats"] = self.rules_stats
+        return pool
+
+    def load_pool(self, pool: dict):
+        """
+        Sets the evaluated rules from a pool of the cache.
+        """
+        offsets = pool["offsets"]
+        n_samples = int(pool["n_samples"])
+        self.rules_list = []
+        for i in range(len(offsets) - 1):
+            part = slice(offsets[i], offsets[i + 1])
+            features = pool["features_indexes"][part].tolist()
+            rule = RegressionRule(
+                HyperrectangleCondition(
+                    features_indexes=features,
+                    bmins=pool["bmins"][part].tolist(),
+                    bmaxs=pool["bmaxs"][part].tolist(),
+                    features_names=[self.features[j] for j in features],
+                )
+            )
+            act = np.unpackbits(pool["activations"][i], count=n_samples)
+            # noinspection PyProtectedMember
+            rule._activation = Activation(act.astype(int))
+            rule._prediction = pool["predictions"][i]
+            rule._std = pool["stds"][i]
+            self.rules_list.append(rule)
+        self.bins = pool["bins"]
+        self.rules_stats = pool.get("rules_stats")
+
+    def compact(self, keep_rules_stats: bool = False):
+        """
+        Frees the memory not needed for prediction: the rules generator,
+        the unselected rules with their activations, the training target,
+        whose cell means are kept by the prediction index, and the cached
+        cells. A compacted model can not be updated with partial_fit.
+        Parameters
+        ----------
+        keep_rules_stats : to keep the statistics of all the extracted
+                           rules in rules_summary
+        Returns
+        -------
+        self : object
+        """
+        f.check_is_fitted(self)
+        if keep_rules_stats:
+            self.rules_summary = np.array(
+                [
+                    (str(rule.condition), len(rule), rule.coverage, rule.prediction, rule.std)
+                    for rule in self.rules_list
+                ],
+                dtype=[
+                    ("condition", object),
+                    ("length", int),
+                    ("coverage", float),
+                    ("prediction", float),
+                    ("std", float),
+                ],
+            )
+        # The activations of the selected rules are kept compressed by ruleskit
+        if self.n_targets is None:
+            self.rules_list = list(self.selected_rs)
+        else:
+            self.rules_list = [rule for rs in self.selected_rs for rule in rs]
+        self.rules_generator = None
+        self.rules_stats = None
+        self.y = None
+        BaseCell.instances = []
+        return self
+
+    def partial_fit(self, xs: np.ndarray, y: np.ndarray, n_expired: int = 0):
+        """
+        Updates a fitted covering algorithm with a new batch of data,
+        without generating new rules.
+        The statistics of the rules are updated from their sufficient
+        statistics (count, sum and sum of squares of y on their activation),
+        then the covering is selected again on the refreshed rules.
+        Parameters
+        ----------
+        xs : {array-like, sparse matrix} of shape (n_samples, n_features)
+            The new input samples.
+        y : array-like of shape (n_samples,)
+            The new target values.
+        n_expired : number of the oldest training samples to forget,
+                    for a sliding window of data
+        Returns
+        -------
+        self : object
+        """
+        f.check_is_fitted(self)
+        if self.y is None:
+            raise ValueError("A compacted covering algorithm can not be updated.")
+        if self.n_targets is not None:
+            raise ValueError("A multi-target covering algorithm can not be updated.")
+        xs, y = check_X_y(
+            xs,
+            y,
+            ensure_min_samples=1,
+            accept_sparse=True,
+            force_all_finite="allow-nan",
+            y_numeric=True,
+        )
+        if xs.shape[1] != len(self.features):
+            raise ValueError(
+                "Number of features of the model must "
+                "match the input. Model n_features is %s and "
+                "input n_features is %s " % (len(self.features), xs.shape[1])
+            )
+        if not 0 <= n_expired <= len(self.y):
+            raise ValueError("n_expired must be between 0 and the number of samples.")
+
+        if self.rules_stats is None:
+            self.rules_stats = np.array(
+                [calc_stats(rule.activation, self.y) for rule in self.rules_list]
+            )
+        y_expired = self.y[:n_expired]
+        if self.bins is not None:
+            xs = self.bins.transform(xs)
+        for i, rule in enumerate(self.rules_list):
+            act = rule.activation
+            if self.bins is None:
+                new_act = ct.eval_activation(rule, xs)
+            else:
+                new_act = self.bins.evaluate(rule, xs)
+            self.rules_stats[i] += calc_stats(new_act, y)
+            self.rules_stats[i] -= calc_stats(act[:n_expired], y_expired)
+            update_rule(
+                rule, np.concatenate([act[n_expired:], new_act]), self.rules_stats[i]
+            )
+
+        self.y = np.concatenate([self.y[n_expired:], y])
+        # The cached cells refer to the previous data
+        BaseCell.instances = []
+        self.select_rules(self.y)
+
+        return self
+
+    def fit_generator(self, xs: np.ndarray, y: np.ndarray, nb_estimator: int, budget: f.Budget):
+        """
+        Fits the rules generator. With a budget, the trees are grown by
+        batches with warm start, until the budget is nearly spent.
+        """
+        if not budget.is_active or type(self.rules_generator) in [
+            AdaBoostRegressor,
+            AdaBoostClassifier,
+            MultiOutputRegressor,
+            MultiOutputClassifier,
+        ]:
+            self.rules_generator.fit(xs, y)
+            return
+
         if type(self.rules_generator) in [
+            HistGradientBoostingRegressor,
+            HistGradientBoostingClassifier,
+        ]:
+            param = "max_iter"
+        else:
+            param = "n_estimators"
+        batch_size = max(1, nb_estimator // 10)
+        self.rules_generator.set_params(warm_start=True)
+        nb_built = 0
+        while nb_built < nb_estimator:
+            nb_built = min(nb_built + batch_size, nb_estimator)
+            self.rules_generator.set_params(**{param: nb_built})
+            self.rules_generator.fit(xs, y)
+            reason = budget.spent_reason()
+            if reason is not None and nb_built < nb_estimator:
+                self.truncation["estimators"] = (nb_built, nb_estimator)
+                self.truncation["reason"] = reason
+                break
+
+    def fit_adaptive(
+        self,
+        xs: np.ndarray,
+        y: np.ndarray,
+        x_min: List[float],
+        x_max: List[float],
+        nb_estimator: int,
+        budget: f.Budget,
+    ):
+        """
+        Grows the trees by batches with warm start. The rules of each batch
+        are extracted and evaluated at once, and the generation stops when
+        the fraction of new eligible rules of a batch falls below
+        min_new_rate, or when the budget is nearly spent. The rate of each
+        batch is kept in new_rules_rates.
+        """
+        if type(self.rules_generator) in [
+            HistGradientBoostingRegressor,
+            HistGradientBoostingClassifier,
+        ]:
+            param = "max_iter"
+        else:
+            param = "n_estimators"
+        batch_size = max(1, nb_estimator // 10)
+        self.rules_generator.set_params(warm_start=True)
+
+        n_train = len(y)
+        cov_min = n_train ** (-self.alpha)
+        beta = pow(n_train, self.alpha / 2.0 - 1.0 / 4)
+        ymean = np.mean(y)
+        seen_rules = set()
+        self.new_rules_rates = []
+        nb_built = 0
+        nb_trees = 0
+        while nb_built < nb_estimator:
+            nb_built = min(nb_built + batch_size, nb_estimator)
+            self.rules_generator.set_params(**{param: nb_built})
+            self.rules_generator.fit(xs, y)
+            tree_list = self.get_trees(self.rules_generator, x_min, x_max)
+            new_rules = f.extract_rules_from_trees(
+                tree_list[nb_trees:], xmins=x_min, xmaxs=x_max, features_names=self.features
+            )
+            nb_trees = len(tree_list)
+            if self.eval_mode == "sampled":
+                new_rules = self.screen_rules(new_rules, xs, y)
+
+            rules_list = self.rules_list
+            self.rules_list = new_rules
+            self.eval_rules(xs, y)
+            new_rules = self.rules_list
+            self.rules_list = rules_list + new_rules
+
+            sigma = self.get_sigma(n_train)
+            nb_eligible = 0
+            for rule in new_rules:
+                key = FitSession.get_key(rule)
+                if key in seen_rules:
+                    continue
+                seen_rules.add(key)
+                if (
+                    len(rule) <= self.l_max
+                    and rule.coverage > cov_min
+                    and ct.is_significant(rule, beta, ymean, sigma)
+                ):
+                    nb_eligible += 1
+            rate = nb_eligible / max(1, len(new_rules))
+            self.new_rules_rates.append(rate)
+
+            if nb_built < nb_estimator:
+                reason = "redundant" if rate < self.min_new_rate else budget.spent_reason()
+                if reason is not None:
+                    self.truncation["estimators"] = (nb_built, nb_estimator)
+                    self.truncation["reason"] = reason
+                    break
+
+    def screen_rules(self, rules_list: List[RegressionRule], xs: np.ndarray, y: np.ndarray):
+        return ct.screen_rules(
+            rules_list,
+            xs,
+            y,
+            self.alpha,
+            self.l_max,
+            self.sample_size,
+            self.confidence,
+            self.seed,
+        )
+
+    def eval_rules_with_budget(self, xs: np.ndarray, y: np.ndarray, budget: f.Budget):
+        """
+        Evaluates the rules by batches, in the order of the trees, until
+        the budget is nearly spent. The rules not evaluated are dropped.
+        """
+        rules_list = self.rules_list
+        nb_rules = len(rules_list)
+        batch_size = max(1, nb_rules // 10)
+        evaluated_rules = []
+        for start in range(0, nb_rules, batch_size):
+            self.rules_list = rules_list[start: start + batch_size]
+            self.eval_rules(xs, y)
+            evaluated_rules += self.rules_list
+            reason = budget.spent_reason()
+            if reason is not None and len(evaluated_rules) < nb_rules:
+                self.truncation["rules"] = (len(evaluated_rules), nb_rules)
+                self.truncation["reason"] = reason
+                break
+        self.rules_list = evaluated_rules
+
+    def extract_rules(self, x_min: List[float], x_max: List[float]):
+        if type(self.rules_generator) in [MultiOutputRegressor, MultiOutputClassifier]:
+            generators = self.rules_generator.estimators_
+        else:
+            generators = [self.rules_generator]
+        for generator in generators:
+            tree_list = self.get_trees(generator, x_min, x_max)
+            self.rules_list += f.extract_rules_from_trees(
+                tree_list, xmins=x_min, xmaxs=x_max, features_names=self.features
+            )
+
+    def get_trees(self, generator, x_min: List[float], x_max: List[float]):
+        if type(generator) in [
             GradientBoostingRegressor,
             GradientBoostingClassifier,
         ]:
-            tree_list = [t[0] for t in self.rules_generator.estimators_]
-        else:
-            tree_list = self.rules_generator.estimators_
-        for tree in tree_list:
-            self.rules_list += extract_rules_from_tree(
-                tree, xmins=x_min, xmaxs=x_max, features_names=self.features
+            return [t[0] for t in generator.estimators_]
+        elif type(generator) in [
+            HistGradientBoostingRegressor,
+            HistGradientBoostingClassifier,
+        ]:
+            # Rules are evaluated on the bins of the generator
+            # noinspection PyProtectedMember
+            bin_mapper = generator._bin_mapper
+            self.bins = ct.FeatureBins(
+                bin_mapper.bin_thresholds_,
+                x_min,
+                x_max,
+                bin_mapper.missing_values_bin_idx_,
             )
+            # noinspection PyProtectedMember
+            return [
+                predictor
+                for predictors in generator._predictors
+                for predictor in predictors
+            ]
+        else:
+            return generator.estimators_
+
+    def set_bins(self, nb_features: int):
+        try:
+            self.bins = ct.BoundsBins.from_rules(self.rules_list, nb_features)
+        except ValueError:
+            # Too many distinct bounds, rules are evaluated on the features
+            self.bins = None
+
+    def get_binned(self, xs: np.ndarray) -> np.ndarray:
+        """
+        Returns the codes of the training features on the bins, computed
+        once per fit for all the batches of rules evaluated.
+        """
+        if self.binned_xs is None or self.binned_xs[0] is not self.bins:
+            self.binned_xs = (self.bins, self.bins.transform(xs))
+        return self.binned_xs[1]
 
     def eval_rules(self, xs: np.ndarray, y: np.ndarray):
-        self.rules_list = Parallel(n_jobs=self.n_jobs, backend="multiprocessing")(
-            delayed(eval_rules)(rule, y, xs) for rule in self.rules_list
+        # On integer codes, the activation of a rule differs from the one
+        # of its bounds on ties, it is not taken from the session
+        if self.session is not None and self.bins is None:
+            self.eval_session_rules(y)
+            return
+        if self.shard_by == "rows":
+            self.eval_rows_shards(xs, y)
+            return
+        # The cost of a rule grows with its number of conditions
+        chunks = ct.make_chunks(
+            [len(rule) + 1 for rule in self.rules_list],
+            self.n_jobs,
+            self.chunks_per_job,
+            len(y),
+        )
+        if y.ndim == 2:
+            self.eval_targets_rules(xs, y, chunks)
+            return
+        if self.bins is None:
+            func, args = eval_rules_chunk, (y, xs)
+        else:
+            func, args = eval_binned_rules_chunk, (y, self.get_binned(xs), self.bins)
+        evaluated_chunks = Parallel(n_jobs=self.n_jobs, backend="multiprocessing")(
+            delayed(func)([self.rules_list[i] for i in chunk], *args)
+            for chunk in chunks
+        )
+        rules_list = [None] * len(self.rules_list)
+        for chunk, evaluated_rules in zip(chunks, evaluated_chunks):
+            for i, rule in zip(chunk, evaluated_rules):
+                rules_list[i] = rule
+        self.rules_list = rules_list
+
+    def eval_rows_shards(self, xs: np.ndarray, y: np.ndarray):
+        """
+        Evaluates the rules by blocks of rows: each task computes the
+        partial statistics and packed activations of all the rules on its
+        rows, then they are summed and concatenated.
+        """
+        if len(self.rules_list) == 0:
+            return
+        ys = y if y.ndim == 2 else y[:, None]
+        if self.bins is not None:
+            xs = self.get_binned(xs)
+        # Blocks aligned on bytes, their packed activations are concatenated
+        blocks = ct.make_blocks(
+            len(y),
+            self.n_jobs,
+            self.chunks_per_job,
+            sum(len(rule) + 1 for rule in self.rules_list),
+            align=8,
+        )
+        results = Parallel(n_jobs=self.n_jobs, backend="multiprocessing")(
+            delayed(eval_rows_block)(self.rules_list, ys[block], xs[block], self.bins)
+            for block in blocks
+        )
+        stats = sum(block_stats for block_stats, _ in results)
+        packed = np.hstack([block_acts for _, block_acts in results])
+        for rule, act, rule_stats in zip(self.rules_list, packed, stats):
+            update_rule(rule, np.unpackbits(act, count=len(y)), rule_stats[:, 0])
+        if y.ndim == 2:
+            if self.rules_stats is None:
+                self.rules_stats = stats
+            else:
+                # Rules evaluated by batches with a budget
+                self.rules_stats = np.concatenate([self.rules_stats, stats])
+
+    def eval_targets_rules(self, xs: np.ndarray, ys: np.ndarray, chunks: List[List[int]]):
+        """
+        Evaluates the activation of each rule once, and its statistics
+        on all the targets, stored in rules_stats of shape (n_rules, 3, k).
+        """
+        if self.bins is not None:
+            xs = self.get_binned(xs)
+        evaluated_chunks = Parallel(n_jobs=self.n_jobs, backend="multiprocessing")(
+            delayed(eval_targets_chunk)([self.rules_list[i] for i in chunk], ys, xs, self.bins)
+            for chunk in chunks
         )
+        rules_list = [None] * len(self.rules_list)
+        rules_stats = np.zeros((len(self.rules_list), 3, ys.shape[1]))
+        for chunk, (evaluated_rules, stats) in zip(chunks, evaluated_chunks):
+            for i, rule, rule_stats in zip(chunk, evaluated_rules, stats):
+                rules_list[i] = rule
+                rules_stats[i] = rule_stats
+        if self.rules_stats is None:
+            self.rules_stats = rules_stats
+        else:
+            # Rules evaluated by batches with a budget
+            self.rules_stats = np.concatenate([self.rules_stats, rules_stats])
+        self.rules_list = rules_list
+
+    def eval_session_rules(self, y: np.ndarray):
+        """
+        Evaluates the rules with the caches of the session.
+        """
+        if len(self.rules_list) == 0:
+            return
+        evaluated = [self.session.eval_rule(rule) for rule in self.rules_list]
+        for rule, (act, stats) in zip(self.rules_list, evaluated):
+            update_rule(rule, act, stats if y.ndim == 1 else stats[:, 0])
+        if y.ndim == 2:
+            rules_stats = np.array([stats for _, stats in evaluated])
+            if self.rules_stats is None:
+                self.rules_stats = rules_stats
+            else:
+                self.rules_stats = np.concatenate([self.rules_stats, rules_stats])
 
     def select_rules(self, y: np.ndarray):
+        if y.ndim == 1:
+            self.selected_rs, self.prediction_index = self.select_target_rules(
+                self.rules_list, y
+            )
+            return
+
+        self.selected_rs = []
+        self.prediction_index = []
+        for j in range(y.shape[1]):
+            # Copies of the rules share their activations
+            rules_list = [copy(rule) for rule in self.rules_list]
+            for rule, stats in zip(rules_list, self.rules_stats[:, :, j]):
+                set_rule_stats(rule, stats)
+            selected_rs, prediction_index = self.select_target_rules(rules_list, y[:, j])
+            self.selected_rs.append(selected_rs)
+            self.prediction_index.append(prediction_index)
+
+    def select_target_rules(self, rules_list: List[RegressionRule], y: np.ndarray):
         sub_rulelist = list(
-            filter(lambda rule: len(rule) <= self.l_max, self.rules_list)
+            filter(lambda rule: len(rule) <= self.l_max, rules_list)
         )
-        sigma = self.get_sigma(len(y))
-        self.selected_rs = ct.find_covering(
-            sub_rulelist, y, sigma, self.alpha, self.gamma
+        sigma = self.get_sigma(len(y), rules_list)
+        selected_rs = ct.find_covering(
+            sub_rulelist, y, sigma, self.alpha, self.gamma, self.sketch_size, self.seed
         )
+        return selected_rs, ct.PredictionIndex(selected_rs, y, self.bins)
 
     def set_rule_generator(self, nb_estimator, subsample, mode):
+        multi_output = self.n_targets is not None and self.generator not in [
+            RandomForestClassifier,
+            RandomForestRegressor,
+        ]
+        if multi_output:
+            # One generator per target, sharing the number of estimators
+            nb_estimator = int(np.ceil(nb_estimator / self.n_targets))
+        self.set_single_generator(nb_estimator, subsample, mode)
+        if multi_output:
+            if isinstance(self.rules_generator, (GradientBoostingClassifier, AdaBoostClassifier,
+                                                 HistGradientBoostingClassifier)):
+                self.rules_generator = MultiOutputClassifier(self.rules_generator)
+            else:
+                self.rules_generator = MultiOutputRegressor(self.rules_generator)
+
+    def set_single_generator(self, nb_estimator, subsample, mode):
         if self.generator is None:
             if mode.lower() in ["regression", "reg", "r"]:
                 self.rules_generator = GradientBoostingRegressor(
@@ -197,6 +1061,17 @@ class CA:
                 random_state=self.seed,
                 max_depth=100,
             )
+        elif self.generator in [
+            HistGradientBoostingRegressor,
+            HistGradientBoostingClassifier,
+        ]:
+            self.rules_generator = self.generator(
+                max_iter=nb_estimator,
+                max_leaf_nodes=self.tree_size,
+                learning_rate=self.learning_rate,
+                random_state=self.seed,
+                early_stopping=False,
+            )
         elif self.generator in [AdaBoostRegressor, AdaBoostClassifier]:
             self.rules_generator = self.generator(
                 n_estimators=nb_estimator,
@@ -206,19 +1081,105 @@ class CA:
         else:
             raise ValueError(
                 "Covering Algorithm only works with "
-                "RandomForest, GradientBoosting and AdBoost!"
+                "RandomForest, GradientBoosting, HistGradientBoosting and AdBoost!"
             )
 
-    def get_sigma(self, n_train: int):
+    def get_sigma(self, n_train: int, rules_list: List[RegressionRule] = None):
+        if rules_list is None:
+            rules_list = self.rules_list
         sigma = np.nanmin(
             [
                 r.std ** 2 if r.coverage > n_train ** (-self.alpha) else np.nan
-                for r in self.rules_list
+                for r in rules_list
             ]
         )
         return sigma
 
-    def predict(self, xs: np.ndarray):
+    @property
+    def used_features(self) -> List[int]:
+        """
+        Indexes of the features referenced by the selected rules.
+        """
+        f.check_is_fitted(self)
+        rulesets = [self.selected_rs] if self.n_targets is None else self.selected_rs
+        return sorted(
+            {int(j) for rs in rulesets for rule in rs for j in rule.condition.features_indexes}
+        )
+
+    @property
+    def used_features_names(self) -> List[str]:
+        return [self.features[j] for j in self.used_features]
+
+    def get_columns(self, xs, features: List[Union[int, str]] = None):
+        """
+        Returns the input as an array, and the map from each used
+        feature to its column, None if all the features are given in order.
+        Only the columns of the used features are selected and converted.
+        """
+        if not hasattr(xs, "shape"):
+            xs = np.asarray(xs)
+        is_frame = hasattr(xs, "columns")
+        if features is None and is_frame:
+            # Columns named as the features are matched by name, the others by position
+            if set(self.used_features_names).issubset(xs.columns):
+                features = list(xs.columns)
+        nb_columns = xs.shape[1]
+        if features is None:
+            if nb_columns == len(self.features):
+                if not is_frame:
+                    return np.asarray(xs, dtype=float), None
+                features = list(range(nb_columns))
+            else:
+                features = self.used_features
+                if nb_columns != len(features):
+                    raise ValueError(
+                        "Number of features of the model must "
+                        "match the input. Model n_features is %s, %s being used, and "
+                        "input n_features is %s " % (len(self.features), len(features), nb_columns)
+                    )
+        if len(features) != nb_columns:
+            raise ValueError("The input must have one column per given feature.")
+        names = {name: j for j, name in enumerate(self.features)}
+        positions = {}
+        for k, feature in enumerate(features):
+            if isinstance(feature, str):
+                if feature not in names:
+                    # Extra columns are ignored
+                    continue
+                feature = names[feature]
+            positions[int(feature)] = k
+        used_features = self.used_features
+        missing = [self.features[j] for j in used_features if j not in positions]
+        if len(missing) > 0:
+            raise ValueError("Features used by the model are missing: %s" % missing)
+
+        selected = [positions[j] for j in used_features]
+        if is_frame:
+            xs = xs.iloc[:, selected].to_numpy(dtype=float)
+        else:
+            xs = np.asarray(xs[:, selected], dtype=float)
+        return xs, {j: k for k, j in enumerate(used_features)}
+
+    def read_used_columns(self, path: str, **kwargs) -> pd.DataFrame:
+        """
+        Reads from a file only the columns of the features used by the
+        selected rules, to be given to predict. Parquet files are read by
+        columns, the other files as CSV with the columns selected while
+        parsing.
+        Parameters
+        ----------
+        path : path of the file, with the columns named as features
+        kwargs : arguments of pandas.read_parquet or pandas.read_csv
+        Returns
+        -------
+        data : a pandas DataFrame
+        """
+        names = self.used_features_names
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path, columns=names, **kwargs)
+        return pd.read_csv(path, usecols=names, **kwargs)[names]
+
+    def predict(self, xs: np.ndarray, features: List[Union[int, str]] = None):
         """
         Predict regression target for X.
         The predicted regression target of an input sample is computed as the
@@ -229,6 +1190,10 @@ class CA:
             The input samples. Internally, its dtype will be converted to
             ``dtype=np.float32``. If a sparse matrix is provided, it will be
             converted into a sparse ``csr_matrix``.
+            It may also hold only the columns of used_features, in this
+            order, or the columns given by features. The columns of a
+            DataFrame are matched by name.
+        features : names or indexes of the features of the columns of xs
 
         Returns
         -------
@@ -237,13 +1202,9 @@ class CA:
         """
         f.check_is_fitted(self)
         # Check data
-        n_features = xs.shape[1]
-        if len(self.features) != n_features:
-            raise ValueError(
-                "Number of features of the model must "
-                "match the input. Model n_features is %s and "
-                "input n_features is %s " % (len(self.features), n_features)
+        xs, columns = self.get_columns(xs, features)
+        if self.n_targets is not None:
+            return np.column_stack(
+                [index.predict(xs, columns) for index in self.prediction_index]
             )
-        else:
-            prediction_vector = ct.calc_prediction(self.selected_rs, self.y, xs, self.n_jobs)
-            return prediction_vector
+        return self.prediction_index.predict(xs, columns)
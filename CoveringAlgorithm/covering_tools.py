@@ -1,8 +1,7 @@
-import copy
 import math
 from typing import List, Union, Tuple
 import numpy as np
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, effective_n_jobs
 
 from ruleskit.utils.rfunctions import conditional_mean
 from ruleskit import RuleSet
@@ -11,11 +10,20 @@ from ruleskit import Activation
 
 from .cell import Cell
 
+# Number of elementary operations below which a parallel task is not split
+MIN_TASK_SIZE = 10 ** 6
+
 
 def eval_activation(rule, x):
     return rule.evaluate(x).raw
 
 
+def eval_activations(rules_list, x, bins=None):
+    if bins is not None:
+        return np.array([bins.evaluate(rule, x) for rule in rules_list])
+    return np.array([eval_activation(rule, x) for rule in rules_list])
+
+
 def eval_cell(act, y):
     cell = Cell(act)
     if cell.prediction is None:
@@ -23,6 +31,78 @@ def eval_cell(act, y):
     return cell.prediction
 
 
+def eval_cells(cells, y):
+    """
+    Computes the conditional mean of each cell of a block of rows,
+    only once per distinct cell.
+    """
+    unique_cells, inverse = np.unique(cells, axis=0, return_inverse=True)
+    predictions = np.array([eval_cell(act, y) for act in unique_cells])
+    return predictions[inverse.ravel()]
+
+
+def get_nb_chunks(
+    nb_items: int, n_jobs: int = None, chunks_per_job: int = 4, item_size: int = 1
+) -> int:
+    """
+    Returns the number of parallel tasks to use for nb_items items,
+    each one costing item_size elementary operations. There are
+    chunks_per_job tasks per worker, unless it makes tasks smaller
+    than MIN_TASK_SIZE.
+    """
+    nb_chunks = effective_n_jobs(n_jobs) * chunks_per_job
+    max_chunks = nb_items * max(1, item_size) // MIN_TASK_SIZE
+    return int(max(1, min(nb_chunks, max_chunks, nb_items)))
+
+
+def make_chunks(
+    costs: Union[List[float], np.ndarray],
+    n_jobs: int = None,
+    chunks_per_job: int = 4,
+    item_size: int = 1,
+) -> List[np.ndarray]:
+    """
+    Partitions items into chunks of balanced total cost. Items are given
+    by decreasing cost to the least loaded chunk.
+
+    Returns
+    -------
+    chunks: list of sorted arrays of indexes of the items
+    """
+    costs = np.asarray(costs, dtype=float)
+    nb_items = len(costs)
+    nb_chunks = get_nb_chunks(nb_items, n_jobs, chunks_per_job, item_size)
+    if nb_chunks == 1:
+        return [np.arange(nb_items)]
+
+    loads = np.zeros(nb_chunks)
+    chunks = [[] for _ in range(nb_chunks)]
+    for i in np.argsort(-costs, kind="stable"):
+        chunk_id = np.argmin(loads)
+        chunks[chunk_id].append(i)
+        loads[chunk_id] += costs[i]
+    return [np.sort(chunk) for chunk in chunks if len(chunk) > 0]
+
+
+def make_blocks(
+    nb_rows: int,
+    n_jobs: int = None,
+    chunks_per_job: int = 4,
+    row_size: int = 1,
+    align: int = 1,
+) -> List[slice]:
+    """
+    Partitions rows into contiguous blocks of similar sizes.
+    All the blocks but the last one start at a multiple of align.
+    """
+    nb_blocks = get_nb_chunks(nb_rows, n_jobs, chunks_per_job, row_size)
+    bounds = np.linspace(0, nb_rows, nb_blocks + 1).astype(int) // align * align
+    bounds[-1] = nb_rows
+    return [
+        slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if start < stop
+    ]
+
+
 def interpretability_index(rs: Union[RuleSet, List[RegressionRule]]) -> int:
     return sum(map(lambda r: len(r), rs))
 
@@ -45,12 +125,164 @@ def union_test(rule: RegressionRule, act: Activation, gamma=0.80):
     return ans
 
 
+class BottomKSketches:
+    """
+    Bottom-k MinHash sketches of rules activations, for approximate
+    union tests.
+
+    Each sample gets a random hash, and the sketch of a set of samples is
+    its k smallest hashes. The sketch of a union is the k smallest hashes of
+    the union of the sketches. The Jaccard index of two sets is estimated by
+    the fraction of the k smallest hashes of their union found in both
+    sketches, which gives their intersection count from their exact sizes.
+    """
+
+    def __init__(self, n_samples: int, k: int = 256, z: float = 3.0, seed: int = None):
+        """
+        Parameters
+        ----------
+        n_samples: number of samples of the activations
+        k: size of the sketches
+        z: number of standard errors of the estimated intersection within
+           which a union test is computed exactly
+        seed: seed of the hashes
+        """
+        if k < 1:
+            raise ValueError("The size of the sketches must be positive.")
+        self.k = k
+        self.z = z
+        # A permutation gives distinct hashes
+        self.hashes = np.random.default_rng(seed).permutation(n_samples)
+        self.sketches = {}
+
+    def make(self, act: np.ndarray) -> np.ndarray:
+        values = self.hashes[np.flatnonzero(act)]
+        if len(values) > self.k:
+            values = np.partition(values, self.k - 1)[: self.k]
+        return np.sort(values)
+
+    def get(self, rule: RegressionRule) -> np.ndarray:
+        key = id(rule)
+        if key not in self.sketches:
+            self.sketches[key] = self.make(rule.activation)
+        return self.sketches[key]
+
+    def merge(self, sketch_a: np.ndarray, sketch_b: np.ndarray) -> np.ndarray:
+        return np.union1d(sketch_a, sketch_b)[: self.k]
+
+    def estimate_intersection(
+        self, sketch_a: np.ndarray, sketch_b: np.ndarray, nb_a: int, nb_b: int
+    ) -> Tuple[float, float]:
+        """
+        Returns a confidence interval of the number of points
+        in common of two sets of sizes nb_a and nb_b.
+        """
+        if len(sketch_a) < self.k and len(sketch_b) < self.k:
+            # The sketches hold the whole sets
+            inter = len(np.intersect1d(sketch_a, sketch_b, assume_unique=True))
+            return inter, inter
+        union_sketch = self.merge(sketch_a, sketch_b)
+        common = np.isin(union_sketch, sketch_a, assume_unique=True) & np.isin(
+            union_sketch, sketch_b, assume_unique=True
+        )
+        m = len(union_sketch)
+        jaccard = common.mean()
+        error = self.z * np.sqrt(max(jaccard * (1 - jaccard), 1.0 / m) / m)
+        low, high = max(0.0, jaccard - error), min(1.0, jaccard + error)
+        return low * (nb_a + nb_b) / (1 + low), high * (nb_a + nb_b) / (1 + high)
+
+
+def approx_union_test(
+    rule: RegressionRule,
+    act: Activation,
+    act_sketch: np.ndarray,
+    sketches: BottomKSketches,
+    gamma=0.80,
+):
+    """
+    Same test as union_test, the points in common being estimated with
+    sketches. It is computed exactly only if the estimate is not
+    conclusive.
+    """
+    # noinspection PyProtectedMember
+    pts_rule = rule._activation.nones
+    pts_act = act.nones
+    low, high = sketches.estimate_intersection(
+        sketches.get(rule), act_sketch, pts_rule, pts_act
+    )
+    threshold = gamma * min(pts_rule, pts_act)
+    if high < threshold:
+        return True
+    if low >= threshold:
+        return False
+    return union_test(rule, act, gamma)
+
+
+class SampleIndex:
+    """
+    Inverted index from blocks of samples to the rules activated on them.
+
+    Each block of ``block_size`` consecutive samples holds a bitmask of the
+    indexed rules that are active on at least one of its samples, so the
+    rules sharing points with a new activation are found with a single
+    OR-reduction over the blocks it activates.
+    """
+
+    def __init__(self, n_samples: int, block_size: int = None):
+        if block_size is None:
+            block_size = max(1, int(np.ceil(n_samples / 4096)))
+        self.block_size = block_size
+        nb_blocks = int(np.ceil(n_samples / block_size))
+        self.masks = np.zeros((nb_blocks, 1), dtype=np.uint64)
+        self.rules = []
+        # Rules without any active sample can not be pruned by the index
+        self.empty_rules = []
+
+    def get_blocks(self, rule: RegressionRule) -> np.ndarray:
+        return np.unique(np.flatnonzero(rule.activation) // self.block_size)
+
+    def add(self, rule: RegressionRule):
+        rule_id = len(self.rules)
+        self.rules.append(rule)
+        blocks = self.get_blocks(rule)
+        if len(blocks) == 0:
+            self.empty_rules.append(rule_id)
+            return
+        word, bit = divmod(rule_id, 64)
+        if word >= self.masks.shape[1]:
+            extension = np.zeros_like(self.masks)
+            self.masks = np.hstack([self.masks, extension])
+        self.masks[blocks, word] |= np.uint64(1) << np.uint64(bit)
+
+    def get_overlapping(self, rule: RegressionRule) -> List[RegressionRule]:
+        """
+        Returns the indexed rules sharing at least one block of samples
+        with the given rule, in insertion order.
+        """
+        blocks = self.get_blocks(rule)
+        ids = list(self.empty_rules)
+        if len(blocks) > 0:
+            mask = np.bitwise_or.reduce(self.masks[blocks], axis=0)
+            bits = np.unpackbits(mask.view(np.uint8), bitorder="little")
+            ids += np.flatnonzero(bits).tolist()
+        return [self.rules[i] for i in sorted(ids)]
+
+
 def select_rules(
-    rules_list: List[RegressionRule], gamma: float = 1.0, selected_rs: RuleSet = None
+    rules_list: List[RegressionRule],
+    gamma: float = 1.0,
+    selected_rs: RuleSet = None,
+    block_size: int = None,
+    sketches: BottomKSketches = None,
 ) -> RuleSet:
     """
     Returns a subset of a given rs. This subset is seeking by
     minimization/maximization of the criterion on the training set
+
+    The union test of a candidate is only computed against the selected
+    rules sharing samples with it, found with a SampleIndex. The others
+    have no point in common with the candidate and pass the test.
+    With sketches, the union tests are approximated (see approx_union_test).
     """
     # Then optimization
     if selected_rs is None or len(selected_rs) == 0:
@@ -60,28 +292,63 @@ def select_rules(
         id_rule = 0
 
     nb_rules = len(rules_list)
+    if nb_rules == 0:
+        return selected_rs
+
+    # A null intersection only passes the union test if gamma is positive
+    use_index = gamma > 0
+    if use_index:
+        # noinspection PyProtectedMember
+        index = SampleIndex(selected_rs._activation.length, block_size)
+        for rule in selected_rs:
+            index.add(rule)
+    if sketches is not None:
+        union_sketch = np.array([], dtype=sketches.hashes.dtype)
+        for rule in selected_rs:
+            union_sketch = sketches.merge(union_sketch, sketches.get(rule))
 
     for i in range(id_rule, nb_rules):
         if selected_rs.coverage == 1.0:
             break
-        rs_copy = copy.deepcopy(selected_rs)
         new_rules = rules_list[i]
-        # Test union criteria for each rule in the current selected RuleSet
-        # noinspection PyProtectedMember
-        utest = [union_test(new_rules, rule._activation, gamma) for rule in rs_copy]
-        if all(utest) and union_test(new_rules, selected_rs._activation, gamma):
+        if use_index:
+            tested_rules = index.get_overlapping(new_rules)
+        else:
+            tested_rules = selected_rs
+        # Test union criteria for each rule sharing points with the candidate
+        if sketches is None:
+            # noinspection PyProtectedMember
+            utest = all(
+                union_test(new_rules, rule._activation, gamma) for rule in tested_rules
+            ) and union_test(new_rules, selected_rs._activation, gamma)
+        else:
+            # noinspection PyProtectedMember
+            utest = all(
+                approx_union_test(
+                    new_rules, rule._activation, sketches.get(rule), sketches, gamma
+                )
+                for rule in tested_rules
+            ) and approx_union_test(
+                new_rules, selected_rs._activation, union_sketch, sketches, gamma
+            )
+        if utest:
             selected_rs += new_rules
+            if use_index:
+                index.add(new_rules)
+            if sketches is not None:
+                union_sketch = sketches.merge(union_sketch, sketches.get(new_rules))
     return selected_rs
 
 
+def is_significant(rule, beta, ymean, sigma2):
+    return beta * abs(ymean - rule.prediction) >= math.sqrt(
+        max(0, rule.std ** 2 - sigma2)
+    )
+
+
 def get_significant(
-    rules_list, ymean, beta, gamma, sigma2
+    rules_list, ymean, beta, gamma, sigma2, sketches=None
 ) -> Tuple[RuleSet, List[RegressionRule]]:
-    def is_significant(rule, beta, ymean, sigma2):
-        return beta * abs(ymean - rule.prediction) >= math.sqrt(
-            max(0, rule.std ** 2 - sigma2)
-        )
-
     filtered_rules = filter(
         lambda rule: is_significant(rule, beta, ymean, sigma2), rules_list
     )
@@ -95,7 +362,7 @@ def get_significant(
         )
         # significant_rs.sort_by(crit='crit', maximized=False)
         significant_selected_rs = select_rules(
-            rules_list=significant_rules, gamma=gamma
+            rules_list=significant_rules, gamma=gamma, sketches=sketches
         )
     else:
         significant_selected_rs = RuleSet()
@@ -103,7 +370,7 @@ def get_significant(
     return significant_selected_rs, significant_rules
 
 
-def add_insignificant_rules(rules_list, rs, epsilon, sigma2, gamma):
+def add_insignificant_rules(rules_list, rs, epsilon, sigma2, gamma, sketches=None):
     def is_insignificant(rule, epsilon, sigma2):
         return epsilon >= math.sqrt(max(0, rule.std ** 2 - sigma2))
 
@@ -118,7 +385,7 @@ def add_insignificant_rules(rules_list, rs, epsilon, sigma2, gamma):
             insignificant_rules, key=lambda x: x.std, reverse=False
         )
         selected_rs = select_rules(
-            rules_list=insignificant_rs, gamma=gamma, selected_rs=rs
+            rules_list=insignificant_rs, gamma=gamma, selected_rs=rs, sketches=sketches
         )
     else:
         selected_rs = RuleSet()
@@ -132,8 +399,13 @@ def find_covering(
     sigma2: float = None,
     alpha: float = 1.0 / 2 - 1 / 100,
     gamma: float = 0.95,
+    sketch_size: int = None,
+    seed: int = None,
 ) -> RuleSet:
-
+    """
+    With a sketch_size, the union tests of the selection use bottom-k
+    sketches of that size of the activations, see BottomKSketches.
+    """
     n_train = len(y)
     cov_min = n_train ** (-alpha)
     # print('Minimal coverage rate:', cov_min)
@@ -148,9 +420,13 @@ def find_covering(
 
     beta = pow(n_train, alpha / 2.0 - 1.0 / 4)
     epsilon = beta * np.std(y)
+    if sketch_size is None:
+        sketches = None
+    else:
+        sketches = BottomKSketches(n_train, sketch_size, seed=seed)
 
     significant_selected_rs, significant_rules = get_significant(
-        sub_rules_list, np.mean(y), beta, gamma, sigma2
+        sub_rules_list, np.mean(y), beta, gamma, sigma2, sketches
     )
 
     if significant_selected_rs.coverage < 1.0:
@@ -158,7 +434,7 @@ def find_covering(
             filter(lambda r: r not in significant_rules, sub_rules_list)
         )
         selected_rs = add_insignificant_rules(
-            sub_rules_list, significant_selected_rs, epsilon, sigma2, gamma
+            sub_rules_list, significant_selected_rs, epsilon, sigma2, gamma, sketches
         )
     else:
         selected_rs = significant_selected_rs
@@ -166,18 +442,422 @@ def find_covering(
     return selected_rs
 
 
-def calc_prediction(rules_list: RuleSet, ytrain: np.ndarray, x: np.ndarray, nb_jobs: int = 1):
+class FeatureBins:
+    """
+    Ordered bins of the features, for rules evaluation on integer codes.
+
+    The bin b of the feature j holds the values in
+    ``(bin_thresholds[j][b - 1], bin_thresholds[j][b]]`` and the missing
+    values have the code missing_bin. A rule split at a threshold holds the
+    points strictly above it, as in the tree it comes from. Unlike the tree,
+    which routes missing values by missing_go_to_left, a missing value never
+    activates a condition on its feature, as in PredictionIndex.
+    """
+
+    def __init__(
+        self,
+        bin_thresholds: List[np.ndarray],
+        x_min: np.ndarray,
+        x_max: np.ndarray,
+        missing_bin: int = None,
+    ):
+        self.bin_thresholds = [np.asarray(thresholds, dtype=float) for thresholds in bin_thresholds]
+        self.x_min = np.asarray(x_min, dtype=float)
+        self.x_max = np.asarray(x_max, dtype=float)
+        if missing_bin is None:
+            missing_bin = max(len(thresholds) for thresholds in self.bin_thresholds) + 1
+        self.missing_bin = missing_bin
+        if missing_bin >= 2 ** 16:
+            raise ValueError("At most 65,535 bins by feature are supported.")
+        self.dtype = np.uint8 if missing_bin < 2 ** 8 else np.uint16
+
+    def transform(self, xs: np.ndarray) -> np.ndarray:
+        binned = np.empty(xs.shape, dtype=self.dtype)
+        for j in range(len(self.bin_thresholds)):
+            binned[:, j] = self.transform_feature(xs[:, j], j)
+        return binned
+
+    def transform_feature(self, values: np.ndarray, j: int) -> np.ndarray:
+        codes = np.searchsorted(self.bin_thresholds[j], values, side="left").astype(self.dtype)
+        codes[~np.isfinite(values)] = self.missing_bin
+        return codes
+
+    def get_bounds(self, rule: RegressionRule) -> Tuple[List[int], List[int], List[int]]:
+        """
+        Translates the bounds of a rule into ranges of codes.
+        """
+        condition = rule.condition
+        features = condition.features_indexes
+        lows, highs = [], []
+        for j, bmin, bmax in zip(features, condition.bmins, condition.bmaxs):
+            thresholds = self.bin_thresholds[j]
+            if bmin <= self.x_min[j]:
+                lows.append(0)
+            else:
+                lows.append(np.searchsorted(thresholds, bmin, side="right"))
+            if bmax >= self.x_max[j]:
+                highs.append(len(thresholds))
+            else:
+                highs.append(np.searchsorted(thresholds, bmax, side="left"))
+        return features, lows, highs
+
+    def get_interval(self, j: int, low: int, high: int) -> Tuple:
+        """
+        Returns the values of the feature j with a code in [low, high],
+        as (lower, lower_strict, upper, upper_strict), None if unbounded.
+        """
+        thresholds = self.bin_thresholds[j]
+        lower = (thresholds[low - 1], True) if low > 0 else (None, False)
+        upper = (thresholds[high], False) if high < len(thresholds) else (None, False)
+        return lower + upper
+
+    def evaluate(self, rule: RegressionRule, binned: np.ndarray) -> np.ndarray:
+        act = np.ones(binned.shape[0], dtype=bool)
+        for j, low, high in zip(*self.get_bounds(rule)):
+            codes = binned[:, j]
+            act &= (codes >= low) & (codes <= high) & (codes != self.missing_bin)
+        return act.astype(int)
+
+
+class BoundsBins(FeatureBins):
+    """
+    Bins of the features on the bounds of a set of rules, evaluating
+    exactly their closed intervals.
+
+    For the sorted bounds t_0 < ... < t_{K-1} of a feature, the code 2k + 1
+    is given to the values equal to t_k and the code 2k to the values in
+    ``(t_{k-1}, t_k)``, so ``x >= t_k`` is ``code >= 2k + 1`` and
+    ``x <= t_k`` is ``code <= 2k + 1``.
+    """
+
+    def __init__(self, bin_thresholds: List[np.ndarray], missing_bin: int = None):
+        if missing_bin is None:
+            missing_bin = 2 * max(len(thresholds) for thresholds in bin_thresholds) + 1
+        super().__init__(bin_thresholds, [], [], missing_bin)
+
+    @classmethod
+    def from_rules(cls, rules_list: List[RegressionRule], nb_features: int):
+        bounds = [set() for _ in range(nb_features)]
+        for rule in rules_list:
+            condition = rule.condition
+            for j, bmin, bmax in zip(
+                condition.features_indexes, condition.bmins, condition.bmaxs
+            ):
+                bounds[j].update((bmin, bmax))
+        return cls([np.array(sorted(b), dtype=float) for b in bounds])
+
+    def transform_feature(self, values: np.ndarray, j: int) -> np.ndarray:
+        thresholds = self.bin_thresholds[j]
+        k = np.searchsorted(thresholds, values, side="left")
+        if len(thresholds) > 0:
+            equal = thresholds[np.minimum(k, len(thresholds) - 1)] == values
+        else:
+            equal = np.zeros(len(k), dtype=bool)
+        codes = (2 * k + equal).astype(self.dtype)
+        codes[~np.isfinite(values)] = self.missing_bin
+        return codes
+
+    def get_interval(self, j: int, low: int, high: int) -> Tuple:
+        thresholds = self.bin_thresholds[j]
+        k, odd = divmod(low, 2)
+        if odd:
+            lower = (thresholds[k], False)
+        else:
+            lower = (thresholds[k - 1], True) if k > 0 else (None, False)
+        k, odd = divmod(high, 2)
+        if odd:
+            upper = (thresholds[k], False)
+        else:
+            upper = (thresholds[k], True) if k < len(thresholds) else (None, False)
+        return lower + upper
+
+    def get_bounds(self, rule: RegressionRule) -> Tuple[List[int], List[int], List[int]]:
+        condition = rule.condition
+        features = condition.features_indexes
+        lows, highs = [], []
+        for j, bmin, bmax in zip(features, condition.bmins, condition.bmaxs):
+            thresholds = self.bin_thresholds[j]
+            lows.append(2 * np.searchsorted(thresholds, bmin, side="left") + 1)
+            highs.append(2 * np.searchsorted(thresholds, bmax, side="left") + 1)
+        return features, lows, highs
+
+
+class PredictionIndex:
+    """
+    Index of a set of selected rules answering predictions without
+    evaluating every rule on every row.
+
+    For each feature used by the rules, the sorted bounds of the rules cut
+    the line into elementary intervals (see BoundsBins), each holding the
+    bitmask of the rules whose condition on the feature contains it. The
+    active rules of a row are the AND of the bitmasks of its intervals,
+    found by binary search. The cell of a row is given by its set of active
+    rules, and the conditional means of the training cells are computed once.
+    """
+
+    def __init__(self, rules_list: Union[RuleSet, List[RegressionRule]], y: np.ndarray, bins: FeatureBins = None):
+        rules_list = list(rules_list)
+        self.bins = bins
+        self.nb_rules = len(rules_list)
+        self.default = float(np.mean(y))
+        self.all_rules = np.packbits(np.ones(self.nb_rules, dtype=bool))
+
+        intervals = {}
+        for rule_id, rule in enumerate(rules_list):
+            if bins is None:
+                condition = rule.condition
+                bounds = zip(condition.features_indexes, condition.bmins, condition.bmaxs)
+            else:
+                bounds = zip(*bins.get_bounds(rule))
+            for j, low, high in bounds:
+                intervals.setdefault(j, []).append((rule_id, low, high))
+
+        self.features = sorted(intervals)
+        self.thresholds = []
+        self.masks = []
+        for j in self.features:
+            thresholds = np.array(sorted({b for _, low, high in intervals[j] for b in (low, high)}), dtype=float)
+            # Codes 0 to 2K as in BoundsBins, and 2K + 1 for missing values
+            active = np.zeros((2 * len(thresholds) + 2, self.nb_rules), dtype=bool)
+            active[:-1] = True
+            used = np.zeros(self.nb_rules, dtype=bool)
+            for rule_id, low, high in intervals[j]:
+                used[rule_id] = True
+                low_code = 2 * np.searchsorted(thresholds, low) + 1
+                high_code = 2 * np.searchsorted(thresholds, high) + 1
+                active[:low_code, rule_id] = False
+                active[high_code + 1:, rule_id] = False
+            # Rules without condition on the feature ignore its missing values
+            active[-1] = ~used
+            self.thresholds.append(thresholds)
+            self.masks.append(np.packbits(active, axis=1))
+
+        # Conditional means of the cells of the training set
+        self.cells = {}
+        if self.nb_rules == 0:
+            return
+        activations = np.array([rule.activation for rule in rules_list], dtype=bool).T
+        signatures = np.packbits(activations, axis=1)
+        unique_signatures, inverse = np.unique(signatures, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        means = np.bincount(inverse, weights=y) / np.bincount(inverse)
+        self.cells = {
+            signature.tobytes(): mean
+            for signature, mean in zip(unique_signatures, means)
+            if signature.any()
+        }
+
+    def get_signatures(self, xs: np.ndarray, columns: dict = None) -> np.ndarray:
+        """
+        Returns the packed bitmasks of the active rules of each row.
+        If given, columns maps each feature used by the rules to its
+        column in xs.
+        """
+        signatures = np.tile(self.all_rules, (xs.shape[0], 1))
+        for j, thresholds, masks in zip(self.features, self.thresholds, self.masks):
+            values = xs[:, j if columns is None else columns[j]]
+            if self.bins is not None:
+                values = self.bins.transform_feature(values, j)
+            k = np.searchsorted(thresholds, values, side="left")
+            equal = thresholds[np.minimum(k, len(thresholds) - 1)] == values
+            codes = 2 * k + equal
+            if self.bins is None:
+                missing = ~np.isfinite(values)
+            else:
+                missing = values == self.bins.missing_bin
+            codes[missing] = len(masks) - 1
+            signatures &= masks[codes]
+        return signatures
+
+    def predict(self, xs: np.ndarray, columns: dict = None) -> np.ndarray:
+        """
+        Same predictions as calc_prediction: the conditional mean of the
+        training cell of each row, or the mean of y if no rule is active or
+        if the cell is empty on the training set.
+        """
+        return np.array(
+            [
+                self.cells.get(signature.tobytes(), self.default)
+                for signature in self.get_signatures(xs, columns)
+            ]
+        )
+
+
+def kl_bernoulli(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """
+    Kullback-Leibler divergence between Bernoulli distributions of
+    parameters p and q.
+    """
+    q = np.clip(q, 1e-300, 1 - 1e-16)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        left = np.where(p > 0, p * np.log(p / q), 0.0)
+        right = np.where(p < 1, (1 - p) * np.log((1 - p) / (1 - q)), 0.0)
+    return left + right
+
+
+def binomial_bounds(
+    counts: np.ndarray, size: int, log_term: float, nb_iter: int = 60
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Chernoff (KL) confidence bounds of the parameters of binomial
+    samples: the q such that size * kl(counts / size, q) <= log_term, each
+    bound holding with probability 1 - exp(-log_term). Unlike an additive
+    Hoeffding gap, the bounds shrink with the rate: with no success, the
+    upper bound is about log_term / size.
+    """
+    p = np.asarray(counts, dtype=float) / size
+    low, up = np.zeros_like(p), p.copy()
+    for _ in range(nb_iter):
+        mid = (low + up) / 2
+        inside = size * kl_bernoulli(p, mid) <= log_term
+        up = np.where(inside, mid, up)
+        low = np.where(inside, low, mid)
+    lower_bound = low
+    low, up = p.copy(), np.ones_like(p)
+    for _ in range(nb_iter):
+        mid = (low + up) / 2
+        inside = size * kl_bernoulli(p, mid) <= log_term
+        low = np.where(inside, mid, low)
+        up = np.where(inside, up, mid)
+    return lower_bound, up
+
+
+def screen_rules(
+    rules_list: List[RegressionRule],
+    xs: np.ndarray,
+    y: np.ndarray,
+    alpha: float = 1.0 / 2 - 1 / 100,
+    l_max: int = 3,
+    sample_size: int = None,
+    confidence: float = 0.99,
+    seed: int = None,
+) -> List[RegressionRule]:
+    """
+    Discards the rules which are clearly rejected by the covering, using
+    statistics estimated on a random sample of rows.
+
+    Coverage is bounded with Chernoff (KL) binomial bounds, the conditional
+    mean with the empirical Bernstein inequality and the conditional std with
+    the Maurer-Pontil inequality, holding simultaneously for all rules with
+    the given confidence. Most of the discarded rules are the ones with a
+    low coverage. A rule is discarded if its coverage
+    is surely below ``n ** (-alpha)``, or if its variance is surely above the
+    sigma estimate and it can neither be significant nor insignificant in
+    find_covering (or is longer than ``l_max``). When all the bounds hold,
+    the covering computed from the remaining rules is the exact one.
+
+    Parameters
+    ----------
+    rules_list: rules to screen
+    xs: features matrix
+    y: variable of interest
+    alpha: parameter of the minimal coverage rate
+    l_max: maximal length of the selectable rules
+    sample_size: number of sampled rows
+    confidence: probability that all the bounds hold
+    seed: seed of the rows sampling
+
+    Returns
+    -------
+    rules_list: the rules that still have to be evaluated exactly
+    """
+    n_train = len(y)
+    nb_rules = len(rules_list)
+    if sample_size is None:
+        sample_size = max(10000, n_train // 10)
+    if nb_rules == 0 or sample_size >= n_train:
+        return rules_list
+
+    rng = np.random.RandomState(seed)
+    rows = rng.choice(n_train, size=sample_size, replace=False)
+    xs_sample, y_sample = xs[rows], y[rows]
+
+    y_min, y_max = np.min(y), np.max(y)
+    y_range = y_max - y_min
+    # Union bound over the three statistics of every rule
+    log_term = np.log(6 * nb_rules / (1 - confidence))
+
+    cov_min = n_train ** (-alpha)
+    beta = pow(n_train, alpha / 2.0 - 1.0 / 4)
+    epsilon = beta * np.std(y)
+    ymean = np.mean(y)
+
+    bounds = np.empty((nb_rules, 6))
+    counts = np.zeros(nb_rules)
+    for i, rule in enumerate(rules_list):
+        act = eval_activation(rule, xs_sample).astype(bool)
+        k = np.count_nonzero(act)
+        counts[i] = k
+        if k > 1:
+            y_act = y_sample[act]
+            mean, std = np.mean(y_act), np.std(y_act, ddof=1)
+            mean_gap = std * np.sqrt(2 * log_term / k) + 7 * y_range * log_term / (3 * (k - 1))
+            std_gap = y_range * np.sqrt(2 * log_term / (k - 1))
+            bounds[i, 2:4] = mean - mean_gap, mean + mean_gap
+            bounds[i, 4:6] = std - std_gap, std + std_gap
+        else:
+            bounds[i, 2:6] = y_min, y_max, 0, y_range / 2
+    bounds[:, 0], bounds[:, 1] = binomial_bounds(counts, sample_size, log_term)
+
+    bounds[:, 2:4] = np.clip(bounds[:, 2:4], y_min, y_max)
+    bounds[:, 4:6] = np.clip(bounds[:, 4:6], 0, y_range / 2)
+    cov_low, cov_up = bounds[:, 0], bounds[:, 1]
+    mean_low, mean_up = bounds[:, 2], bounds[:, 3]
+    var_low, var_up = bounds[:, 4] ** 2, bounds[:, 5] ** 2
+
+    # Upper bound of sigma2: the rules surely covering enough points
+    # take part in its estimation
+    surely_covering = cov_low > cov_min
+    if np.any(surely_covering):
+        sigma2_up = np.min(var_up[surely_covering])
+    else:
+        sigma2_up = np.inf
+
+    lengths = np.array([len(rule) for rule in rules_list])
+    gap_up = np.maximum(np.abs(ymean - mean_low), np.abs(ymean - mean_up))
+    dev_low = np.sqrt(np.maximum(0, var_low - sigma2_up))
+    surely_rejected = (dev_low > epsilon) & (dev_low > beta * gap_up)
+    surely_useless = (var_low > sigma2_up) & (surely_rejected | (lengths > l_max))
+
+    keep = (cov_up > cov_min) & ~surely_useless
+    return [rule for rule, k in zip(rules_list, keep) if k]
+
+
+def calc_prediction(
+    rules_list: RuleSet,
+    ytrain: np.ndarray,
+    x: np.ndarray,
+    nb_jobs: int = 1,
+    chunks_per_job: int = 4,
+    bins: FeatureBins = None,
+):
     """
     Computes the prediction vector
     using an rule based partition
+
+    Rules are evaluated by chunks of balanced cost and cells by blocks of
+    rows, with chunks_per_job tasks per worker. If bins are given, rules
+    are evaluated on the codes of x.
     """
+    if x.shape[0] == 0:
+        return np.zeros(0)
+    rules_list = list(rules_list)
+    if bins is not None:
+        x = bins.transform(x)
     # Activation of all rules in the learning set
     activation_matrix = [rule.activation for rule in rules_list]
     activation_matrix = np.array(activation_matrix)
 
-    prediction_matrix = Parallel(n_jobs=nb_jobs, backend="multiprocessing")(
-            delayed(eval_activation)(rule, x) for rule in rules_list)
-    prediction_matrix = np.array(prediction_matrix).T
+    chunks = make_chunks(
+        [len(rule) for rule in rules_list], nb_jobs, chunks_per_job, x.shape[0]
+    )
+    activations = Parallel(n_jobs=nb_jobs, backend="multiprocessing")(
+        delayed(eval_activations)([rules_list[i] for i in chunk], x, bins)
+        for chunk in chunks
+    )
+    prediction_matrix = np.zeros((x.shape[0], len(rules_list)), dtype=int)
+    for chunk, act in zip(chunks, activations):
+        prediction_matrix[:, chunk] = act.T
 
     no_activation_matrix = np.logical_not(prediction_matrix)
 
@@ -196,7 +876,8 @@ def calc_prediction(rules_list: RuleSet, ytrain: np.ndarray, x: np.ndarray, nb_j
     # Calculation of the binary vector for cells of the partition et each row
     cells = (dot_activation - no_activation_vector) > 0
     # Calculation of the conditional expectation in each cell
+    blocks = make_blocks(len(cells), nb_jobs, chunks_per_job, len(ytrain))
     prediction_vector = Parallel(n_jobs=nb_jobs, backend="multiprocessing")(
-            delayed(eval_cell)(act, ytrain) for act in cells)
-    prediction_vector = np.array(prediction_vector)
+            delayed(eval_cells)(cells[block], ytrain) for block in blocks)
+    prediction_vector = np.concatenate(prediction_vector)
     return prediction_vector
@@ -1,11 +1,21 @@
-from typing import List
+import re
+import sys
+import time
+from typing import List, Union
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
+from scipy.sparse import csr_matrix
 from sklearn.exceptions import NotFittedError
 from ruleskit import RegressionRule
 from ruleskit import RuleSet
 from ruleskit import HyperrectangleCondition
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
 
 def check_is_fitted(estimator):
     if len(estimator.rules_list) == 0:
@@ -16,6 +26,49 @@ def check_is_fitted(estimator):
         raise NotFittedError(msg % {"name": type(estimator).__name__})
 
 
+class Budget:
+    """
+    Time and memory budget of a computation. It is spent when the elapsed
+    time or the peak resident memory exceeds the fraction 1 - margin of its
+    limit, the margin being left to end the computation.
+    """
+
+    def __init__(self, time_budget: float = None, memory_budget: float = None, margin: float = 0.1):
+        """
+        Parameters
+        ----------
+        time_budget: limit of elapsed time, in seconds
+        memory_budget: limit of peak resident memory of the process, in bytes
+        margin: fraction of the budgets kept to end the computation
+        """
+        self.time_budget = time_budget
+        self.memory_budget = memory_budget
+        self.margin = margin
+        self.start = time.perf_counter()
+
+    @property
+    def is_active(self) -> bool:
+        return self.time_budget is not None or self.memory_budget is not None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    @staticmethod
+    def memory() -> float:
+        if resource is None:
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return float(peak) if sys.platform == "darwin" else peak * 1024.0
+
+    def spent_reason(self) -> Union[str, None]:
+        if self.time_budget is not None and self.elapsed() > (1 - self.margin) * self.time_budget:
+            return "time"
+        if self.memory_budget is not None and self.memory() > (1 - self.margin) * self.memory_budget:
+            return "memory"
+        return None
+
+
 def mse_function(prediction_vector: np.ndarray, y: np.ndarray):
     """
     Compute the mean squared error
@@ -114,6 +167,55 @@ def calc_coverage(vect: np.ndarray):
     return np.dot(u, u) / float(u.size)
 
 
+def calc_coverage_rate(
+    rules_list: Union[RuleSet, List[RegressionRule]],
+    xs: np.ndarray,
+    block_size: int = 1000,
+) -> float:
+    """
+    Compute the coverage rate of the union of a set of rules
+
+    Rules are evaluated by blocks, only on the points not covered yet by the
+    previous blocks, and the computation stops once all points are covered.
+    Inside a block, the activations of the rules are OR-reduced into a
+    packed bitset, so that the memory does not grow with the block size.
+
+    Parameters
+    ----------
+    rules_list : {RuleSet or list type}
+                 The set of rules
+    xs : {array type}
+         The features matrix
+    block_size : {int type}
+                 Number of rules in a block
+
+    Return
+    ------
+    cov : {float type}
+          The coverage rate
+    """
+    rules_list = list(rules_list)
+    n = xs.shape[0]
+    uncovered = np.arange(n)
+    for start in range(0, len(rules_list), block_size):
+        if len(uncovered) == 0:
+            break
+        x_block = xs[uncovered]
+        covered = np.zeros((len(uncovered) + 7) // 8, dtype=np.uint8)
+        for rule in rules_list[start: start + block_size]:
+            condition = rule.condition
+            act = np.ones(len(uncovered), dtype=bool)
+            for j, bmin, bmax in zip(
+                condition.features_indexes, condition.bmins, condition.bmaxs
+            ):
+                values = x_block[:, j]
+                act &= (values >= bmin) & (values <= bmax) & np.isfinite(values)
+            covered |= np.packbits(act)
+        covered = np.unpackbits(covered, count=len(uncovered)).astype(bool)
+        uncovered = uncovered[~covered]
+    return 1 - len(uncovered) / float(n)
+
+
 def dist(u: np.ndarray, v: np.ndarray):
     """
     Compute the distance between two prediction vector
@@ -137,117 +239,484 @@ def dist(u: np.ndarray, v: np.ndarray):
     return 1 - num / deno
 
 
+# Maximal number of (node, feature) bounds propagated at once
+MAX_BOUNDS_SIZE = 2 ** 24
+
+
+def get_tree_arrays(tree):
+    """
+    Returns the children_left, children_right, feature and threshold arrays
+    of a fitted sklearn tree or of a TreePredictor of HistGradientBoosting.
+    Leaves have -1 children and a negative feature.
+    """
+    if hasattr(tree, "tree_"):
+        tree_ = tree.tree_
+        return tree_.children_left, tree_.children_right, tree_.feature, tree_.threshold
+    nodes = tree.nodes
+    is_leaf = nodes["is_leaf"].astype(bool)
+    return (
+        np.where(is_leaf, -1, nodes["left"]),
+        np.where(is_leaf, -1, nodes["right"]),
+        np.where(is_leaf, -2, nodes["feature_idx"]),
+        nodes["num_threshold"],
+    )
+
+
+def extract_bounds_from_trees(
+    trees: list,
+    xmins: Union[List[float], np.ndarray],
+    xmaxs: Union[List[float], np.ndarray],
+    get_leaf: bool = False,
+    l_max: int = None,
+):
+    """
+    Computes the hyperrectangles of the nodes of fitted sklearn trees,
+    by propagating the bounds of the splits level by level.
+
+    Parameters
+    ----------
+    trees: fitted DecisionTreeRegressor, DecisionTreeClassifier or
+           TreePredictor of HistGradientBoosting
+    xmins, xmaxs: minimal and maximal values of the features
+    get_leaf: to extract only the leaves
+    l_max: maximal number of features in a rule
+
+    Returns
+    -------
+    used: boolean array (nb_rules, nb_features) of the features of each rule
+    bmins, bmaxs: arrays (nb_rules, nb_features) of the bounds of each rule.
+    The rules are the nodes except the roots, in the depth-first order of
+    the trees, left child first.
+    """
+    xmins = np.asarray(xmins, dtype=float)
+    xmaxs = np.asarray(xmaxs, dtype=float)
+    lefts, rights, features, thresholds, trees_ids, roots = [], [], [], [], [], []
+    offset = 0
+    for tree_id, tree in enumerate(trees):
+        children_left, children_right, tree_feature, tree_threshold = get_tree_arrays(tree)
+        for children, stack in [(children_left, lefts), (children_right, rights)]:
+            children = children.astype(np.int64)
+            stack.append(np.where(children >= 0, children + offset, -1))
+        features.append(tree_feature.astype(np.int64))
+        thresholds.append(tree_threshold.astype(float))
+        nb_nodes = len(tree_feature)
+        trees_ids.append(np.full(nb_nodes, tree_id))
+        roots.append(offset)
+        offset += nb_nodes
+
+    nb_nodes = offset
+    left, right = np.concatenate(lefts), np.concatenate(rights)
+    feature, threshold = np.concatenate(features), np.concatenate(thresholds)
+    trees_ids = np.concatenate(trees_ids)
+    roots = np.array(roots, dtype=np.int64)
+
+    used = np.zeros((nb_nodes, len(xmins)), dtype=bool)
+    bmins = np.tile(xmins, (nb_nodes, 1))
+    bmaxs = np.tile(xmaxs, (nb_nodes, 1))
+    levels = []
+    frontier = roots
+    while len(frontier) > 0:
+        levels.append(frontier)
+        split = frontier[feature[frontier] >= 0]
+        split_feature = feature[split]
+        for children in [left[split], right[split]]:
+            used[children] = used[split]
+            bmins[children] = bmins[split]
+            bmaxs[children] = bmaxs[split]
+            used[children, split_feature] = True
+        bmaxs[left[split], split_feature] = np.minimum(
+            bmaxs[split, split_feature], threshold[split]
+        )
+        bmins[right[split], split_feature] = np.maximum(
+            bmins[split, split_feature], threshold[split]
+        )
+        frontier = np.concatenate([left[split], right[split]])
+
+    # Position of each node in the depth-first order, from the subtrees sizes
+    size = np.ones(nb_nodes, dtype=np.int64)
+    for level in reversed(levels):
+        split = level[feature[level] >= 0]
+        size[split] += size[left[split]] + size[right[split]]
+    position = np.zeros(nb_nodes, dtype=np.int64)
+    for level in levels:
+        split = level[feature[level] >= 0]
+        position[left[split]] = position[split] + 1
+        position[right[split]] = position[split] + 1 + size[left[split]]
+
+    keep = np.ones(nb_nodes, dtype=bool)
+    keep[roots] = False
+    if get_leaf:
+        keep &= feature < 0
+    if l_max is not None:
+        keep &= used.sum(axis=1) <= l_max
+    nodes = np.flatnonzero(keep)
+    nodes = nodes[np.lexsort((position[nodes], trees_ids[nodes]))]
+    return used[nodes], bmins[nodes], bmaxs[nodes]
+
+
+def extract_rules_from_trees(
+    trees: list,
+    xmins: Union[List[float], np.ndarray],
+    xmaxs: Union[List[float], np.ndarray],
+    features_names: List[str] = None,
+    get_leaf: bool = False,
+    l_max: int = None,
+) -> List[RegressionRule]:
+    """
+    Extracts the rules of the nodes of fitted sklearn trees, in the same
+    order as ruleskit's extract_rules_from_tree called on each tree.
+    Each rule is the hyperrectangle of its node.
+    Trees are processed by batches of about MAX_BOUNDS_SIZE bounds.
+    """
+    nb_features = len(xmins)
+    if features_names is None:
+        features_names = ["X_" + str(i) for i in range(nb_features)]
+    features_names = list(features_names)
+
+    batches = [[]]
+    batch_size = 0
+    for tree in trees:
+        tree_size = len(get_tree_arrays(tree)[2]) * nb_features
+        if batch_size + tree_size > MAX_BOUNDS_SIZE and len(batches[-1]) > 0:
+            batches.append([])
+            batch_size = 0
+        batches[-1].append(tree)
+        batch_size += tree_size
+
+    rules_list = []
+    for batch in batches:
+        if len(batch) == 0:
+            continue
+        used, bmins, bmaxs = extract_bounds_from_trees(
+            batch, xmins, xmaxs, get_leaf, l_max
+        )
+        for rule_used, rule_bmins, rule_bmaxs in zip(used, bmins, bmaxs):
+            features = np.flatnonzero(rule_used)
+            new_cond = HyperrectangleCondition(
+                features_indexes=features.tolist(),
+                bmins=rule_bmins[features].tolist(),
+                bmaxs=rule_bmaxs[features].tolist(),
+                features_names=[features_names[i] for i in features],
+            )
+            rules_list.append(RegressionRule(new_cond))
+    return rules_list
+
+
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(packed: np.ndarray) -> np.ndarray:
+    """
+    Number of bits set in each byte of a packed array
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(packed)
+    return POPCOUNT_TABLE[packed]
+
+
+def pack_activations(rules_list: Union[RuleSet, List[RegressionRule]]) -> np.ndarray:
+    """
+    Returns the activation vectors of the rules packed into bits,
+    as an array of shape (nb_rules, ceil(n / 8)) of uint8
+    """
+    return np.vstack(
+        [np.packbits(np.asarray(rule.activation, dtype=bool)) for rule in rules_list]
+    )
+
+
+def calc_intersections(
+    packed: np.ndarray, rows: slice, cols: slice, bytes_block: int
+) -> np.ndarray:
+    """
+    Counts the points in common between the activations of two blocks
+    of rules, bytes_block bytes of activation at a time.
+    """
+    row_acts = packed[rows]
+    col_acts = packed[cols]
+    counts = np.zeros((row_acts.shape[0], col_acts.shape[0]), dtype=np.int64)
+    for start in range(0, packed.shape[1], bytes_block):
+        stop = start + bytes_block
+        intersect = row_acts[:, None, start:stop] & col_acts[None, :, start:stop]
+        counts += popcount(intersect).sum(axis=2, dtype=np.int64)
+    return counts
+
+
+def calc_dist_matrix(intersections: np.ndarray, rows_counts: np.ndarray, cols_counts: np.ndarray):
+    """
+    Computes the function dist from the intersection counts of
+    two sets of rules and their numbers of activated points.
+    """
+    deno = np.minimum(rows_counts[:, None], cols_counts[None, :])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dist_matrix = 1 - intersections / deno
+    dist_matrix[deno == 0] = np.nan
+    return dist_matrix
+
+
+def overlap_matrix(
+    rules_list: Union[RuleSet, List[RegressionRule]],
+    metric: str = "intersection",
+    top_k: int = None,
+    block_size: int = 64,
+    n_jobs: int = 1,
+):
+    """
+    Compute the pairwise overlaps of the activations of a set of rules,
+    by blocks of rules on bit-packed activations
+
+    Parameters
+    ----------
+    rules_list : {RuleSet or list type}
+                 Rules with computed activations
+    metric : {str type}
+             "intersection" for the number of points in common,
+             or "dist" for the function dist
+    top_k : {int type}
+            If given, only the top_k most overlapping rules of each rule are
+            kept, the rule itself excluded, in a sparse matrix. With "dist",
+            the rules without activated point have no neighbours
+    block_size : {int type}
+                 Number of rules in a block
+    n_jobs : {int type}
+             Number of threads
+
+    Return
+    ------
+    matrix : {array type or scipy.sparse.csr_matrix}
+             The (nb_rules, nb_rules) matrix of overlaps
+    """
+    if metric not in ["intersection", "dist"]:
+        raise ValueError("metric must be 'intersection' or 'dist'.")
+    if len(rules_list) == 0:
+        matrix = np.zeros((0, 0), dtype=float if metric == "dist" else np.int64)
+        return matrix if top_k is None else csr_matrix(matrix)
+    packed = pack_activations(rules_list)
+    nb_rules = packed.shape[0]
+    counts = popcount(packed).sum(axis=1, dtype=np.int64)
+    # About 8 MB of temporary intersections per task
+    bytes_block = max(1, 2 ** 23 // block_size ** 2)
+    blocks = [slice(i, min(i + block_size, nb_rules)) for i in range(0, nb_rules, block_size)]
+
+    # Threads share the packed activations, numpy releases the GIL on bitwise operations
+    if top_k is None:
+        pairs = [(i, j) for i in range(len(blocks)) for j in range(i, len(blocks))]
+        results = Parallel(n_jobs=n_jobs, backend="threading")(
+            delayed(calc_intersections)(packed, blocks[i], blocks[j], bytes_block)
+            for i, j in pairs
+        )
+        matrix = np.zeros((nb_rules, nb_rules), dtype=np.int64)
+        for (i, j), counts_block in zip(pairs, results):
+            matrix[blocks[i], blocks[j]] = counts_block
+            matrix[blocks[j], blocks[i]] = counts_block.T
+        if metric == "dist":
+            matrix = calc_dist_matrix(matrix, counts, counts)
+        return matrix
+
+    top_k = min(top_k, nb_rules - 1)
+    results = Parallel(n_jobs=n_jobs, backend="threading")(
+        delayed(calc_top_overlaps)(packed, counts, block, blocks, metric, top_k, bytes_block)
+        for block in blocks
+    )
+    rows = np.concatenate([r[0] for r in results])
+    cols = np.concatenate([r[1] for r in results])
+    values = np.concatenate([r[2] for r in results])
+    return csr_matrix((values, (rows, cols)), shape=(nb_rules, nb_rules))
+
+
+def calc_top_overlaps(
+    packed: np.ndarray,
+    counts: np.ndarray,
+    rows: slice,
+    blocks: List[slice],
+    metric: str,
+    top_k: int,
+    bytes_block: int,
+):
+    """
+    Returns the top_k most overlapping rules of each rule of a block,
+    as (rows, cols, values) coordinates.
+    """
+    stripe = np.hstack(
+        [calc_intersections(packed, rows, cols, bytes_block) for cols in blocks]
+    )
+    rows_ids = np.arange(rows.start, rows.stop)
+    if metric == "dist":
+        stripe = calc_dist_matrix(stripe, counts[rows], counts)
+        # The smallest distances are the largest overlaps
+        scores = np.nan_to_num(stripe, nan=np.inf)
+    else:
+        scores = -stripe.astype(float)
+    scores[np.arange(len(rows_ids)), rows_ids] = np.inf
+    if top_k <= 0:
+        empty = np.array([], dtype=int)
+        return empty, empty, np.array([], dtype=stripe.dtype)
+    cols_ids = np.argpartition(scores, top_k - 1, axis=1)[:, :top_k]
+    values = np.take_along_axis(stripe, cols_ids, axis=1)
+    # The distance to a rule without activated point is undefined, such
+    # pairs are not neighbours
+    kept = np.isfinite(np.take_along_axis(scores, cols_ids, axis=1)).ravel()
+    return np.repeat(rows_ids, top_k)[kept], cols_ids.ravel()[kept], values.ravel()[kept]
+
+
+RULEFIT_CONDITION = re.compile(r"^\s*(.+?)\s*(<=|>=|<|>)\s*(\S+)\s*$")
+R_CONDITION = re.compile(r"^\s*(.+?)\s+in\s+([^;\s]+)\s*;\s*(\S+)\s*$")
+
+
+def get_feature_id(name: str, features_dict: dict) -> int:
+    feat_id = features_dict.get(name)
+    if feat_id is None:
+        if "feature_" in name:
+            feat_id = int(name.split("_")[-1])
+        else:
+            raise ValueError("Unknown feature %s" % name)
+    return feat_id
+
+
+def make_rs_from_bounds(
+    rules_ids: List[int],
+    features_ids: List[int],
+    bmins: List[float],
+    bmaxs: List[float],
+    nb_rules: int,
+    features_names_list: List[str],
+    xmin: List[float],
+    xmax: List[float],
+) -> RuleSet:
+    """
+    Builds a RuleSet from the elementary conditions of all the rules at once.
+    The conditions of a rule on the same feature are intersected, and the
+    infinite bounds are replaced by the bounds of the feature.
+
+    Parameters
+    ----------
+    rules_ids: rule of each elementary condition
+    features_ids: feature of each elementary condition
+    bmins, bmaxs: bounds of each elementary condition, possibly infinite
+    nb_rules: number of rules
+    features_names_list: names of the features
+    xmin, xmax: minimal and maximal values of the features
+    """
+    nb_features = len(features_names_list)
+    xmin = np.asarray(xmin, dtype=float)
+    xmax = np.asarray(xmax, dtype=float)
+    features_ids = np.asarray(features_ids, dtype=int)
+    keys = np.asarray(rules_ids, dtype=np.int64) * nb_features + features_ids
+    keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+
+    merged_bmins = np.full(len(keys), -np.inf)
+    merged_bmaxs = np.full(len(keys), np.inf)
+    np.maximum.at(merged_bmins, inverse, np.asarray(bmins, dtype=float))
+    np.minimum.at(merged_bmaxs, inverse, np.asarray(bmaxs, dtype=float))
+    merged_features = features_ids[first]
+    merged_bmins = np.where(
+        np.isneginf(merged_bmins), xmin[merged_features], merged_bmins
+    )
+    merged_bmaxs = np.where(
+        np.isposinf(merged_bmaxs), xmax[merged_features], merged_bmaxs
+    )
+
+    # keys are sorted, so are the rules of the merged conditions
+    rules_of_conditions = keys // nb_features
+    bounds = np.searchsorted(rules_of_conditions, np.arange(nb_rules + 1))
+    # A rule is impossible if one of its bmin is above its bmax
+    nb_impossible = np.zeros(nb_rules, dtype=int)
+    np.add.at(nb_impossible, rules_of_conditions, merged_bmins > merged_bmaxs)
+    merged_names = np.asarray(features_names_list, dtype=object)[merged_features]
+
+    # The conditions are checked above for all the rules at once, so the
+    # objects are filled directly instead of validating each one
+    template = RegressionRule().__dict__
+    rules_list = []
+    for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        new_cond = HyperrectangleCondition(empty=True)
+        # noinspection PyProtectedMember
+        new_cond._features_indexes = merged_features[start:stop].tolist()
+        # noinspection PyProtectedMember
+        new_cond._bmins = merged_bmins[start:stop].tolist()
+        # noinspection PyProtectedMember
+        new_cond._bmaxs = merged_bmaxs[start:stop].tolist()
+        # noinspection PyProtectedMember
+        new_cond._features_names = merged_names[start:stop].tolist()
+        new_cond.impossible = bool(nb_impossible[i])
+        rule = RegressionRule.__new__(RegressionRule)
+        rule.__dict__.update(template)
+        rule.__dict__["_condition"] = new_cond
+        rules_list.append(rule)
+
+    if len(rules_list) == 0:
+        return RuleSet([])
+    # The RuleSet is built from its first rule, then extended at once
+    rs = RuleSet(rules_list[:1])
+    # noinspection PyProtectedMember
+    rs._rules += rules_list[1:]
+    rs.features_indexes = np.unique(merged_features).tolist()
+    rs.features_names = list(set(merged_names.tolist()))
+    rs.set_features_indexes()
+    return rs
+
+
 def extract_rules_rulefit(
     rules_df: pd.DataFrame,
     features_names_list: List[str],
     bmins_list: List[float],
     bmaxs_list: List[float],
 ) -> RuleSet:
-    rulefit_ruleset = RuleSet()
-
-    for rule in rules_df["rule"].values:
-        if "&" in rule:
-            rule_split = rule.split(" & ")
-        else:
-            rule_split = [rule]
-
-        features_names = []
-        features_indexes = []
-        bmins = []
-        bmaxs = []
-
-        for sub_rule in rule_split:
-            sub_rule = sub_rule.replace("=", "")
-
-            if ">" in sub_rule:
-                sub_rule = sub_rule.split(" > ")
-                if "feature_" in sub_rule[0]:
-                    feat_id = sub_rule[0].split("_")[-1]
-                    feat_id = int(feat_id)
-                else:
-                    feat_id = features_names_list.index(sub_rule[0])
-
-                if feat_id in features_indexes:
-                    duplicated_id = features_indexes.index(feat_id)
-                    if bmins[duplicated_id] > float(sub_rule[-1]):
-                        bmins[duplicated_id] = float(sub_rule[-1])
-                else:
-                    features_names += [features_names_list[feat_id]]
-                    features_indexes += [feat_id]
-                    bmins += [float(sub_rule[-1])]
-                    bmaxs += [bmaxs_list[feat_id]]
-
+    features_dict = {name: i for i, name in enumerate(features_names_list)}
+    rules_ids, features_ids, bmins, bmaxs = [], [], [], []
+
+    for rule_id, rule in enumerate(rules_df["rule"].values):
+        for sub_rule in rule.split(" & "):
+            match = RULEFIT_CONDITION.match(sub_rule)
+            if match is None:
+                raise ValueError("Can not parse the condition %s" % sub_rule)
+            name, operator, value = match.groups()
+            rules_ids.append(rule_id)
+            features_ids.append(get_feature_id(name, features_dict))
+            if ">" in operator:
+                bmins.append(float(value))
+                bmaxs.append(np.inf)
             else:
-                sub_rule = sub_rule.split(" < ")
-                if "feature_" in sub_rule[0]:
-                    feat_id = sub_rule[0].split("_")[-1]
-                    feat_id = int(feat_id)
-                else:
-                    feat_id = features_names_list.index(sub_rule[0])
-
-                if feat_id in features_indexes:
-                    duplicated_id = features_indexes.index(feat_id)
-                    if bmaxs[duplicated_id] > float(sub_rule[-1]):
-                        bmaxs[duplicated_id] = float(sub_rule[-1])
-                else:
-                    features_names += [features_names_list[feat_id]]
-                    features_indexes += [feat_id]
-                    bmaxs += [float(sub_rule[-1])]
-                    bmins += [bmins_list[feat_id]]
-
-        new_cond = HyperrectangleCondition(
-            features_names=features_names,
-            features_indexes=features_indexes,
-            bmins=bmins,
-            bmaxs=bmaxs,
-        )
-        rulefit_ruleset += RegressionRule(new_cond)
+                bmins.append(-np.inf)
+                bmaxs.append(float(value))
 
-    return rulefit_ruleset
+    return make_rs_from_bounds(
+        rules_ids,
+        features_ids,
+        bmins,
+        bmaxs,
+        len(rules_df),
+        list(features_names_list),
+        bmins_list,
+        bmaxs_list,
+    )
 
 
 def make_rs_from_r(
     df: pd.DataFrame, features_list: List[str], xmin: List[float], xmax: List[float]
 ) -> RuleSet:
-    rules = df["Rules"].values
-    r_ruleset = RuleSet()
-    for i in range(len(rules)):
-        rl_i = rules[i].split(" AND ")
-        cp = len(rl_i)
-        conditions = [[] for _ in range(6)]
-
-        for j in range(cp):
-            feature_name = rl_i[j].split(" in ")[0]
-            feature_name = feature_name.replace(".", " ")
-            feature_id = features_list.index(feature_name)
-            bmin = rl_i[j].split(" in ")[1].split(";")[0]
-            if bmin == "-Inf":
-                bmin = xmin[feature_id]
-            else:
-                bmin = float(bmin)
-            bmax = rl_i[j].split(" in ")[1].split(";")[1]
-            if bmax == "Inf":
-                bmax = xmax[feature_id]
-            else:
-                bmax = float(bmax)
-            if feature_id in conditions[0]:
-                duplicated_id = conditions[0].index(feature_id)
-                if conditions[1][duplicated_id] < bmin:
-                    conditions[1][duplicated_id] = bmin
-                if conditions[2][duplicated_id] > bmax:
-                    conditions[2][duplicated_id] = bmax
-            else:
-                conditions[0] += [feature_id]
-                conditions[1] += [bmin]
-                conditions[2] += [bmax]
-                conditions[3] += [feature_name]
-
-        new_cond = HyperrectangleCondition(
-            features_indexes=conditions[0],
-            bmins=conditions[1],
-            bmaxs=conditions[2],
-            features_names=conditions[3],
-        )
-        r_ruleset += RegressionRule(new_cond)
-
-    return r_ruleset
+    features_dict = {name: i for i, name in enumerate(features_list)}
+    rules_ids, features_ids, bmins, bmaxs = [], [], [], []
+
+    for rule_id, rule in enumerate(df["Rules"].values):
+        for sub_rule in re.split(r"\s+AND\s+", rule.strip()):
+            match = R_CONDITION.match(sub_rule)
+            if match is None:
+                raise ValueError("Can not parse the condition %s" % sub_rule)
+            name, bmin, bmax = match.groups()
+            # R replaces the spaces of the features names by dots
+            rules_ids.append(rule_id)
+            features_ids.append(get_feature_id(name.replace(".", " "), features_dict))
+            bmins.append(-np.inf if bmin == "-Inf" else float(bmin))
+            bmaxs.append(np.inf if bmax == "Inf" else float(bmax))
+
+    return make_rs_from_bounds(
+        rules_ids,
+        features_ids,
+        bmins,
+        bmaxs,
+        len(df),
+        list(features_list),
+        xmin,
+        xmax,
+    )
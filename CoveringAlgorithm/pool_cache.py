@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from os.path import join, exists, getsize
+from typing import Union
+import numpy as np
+
+# Number of bytes of the data hashed at once
+HASH_BLOCK_SIZE = 1 << 24
+
+# To increment when the extraction or evaluation of the rules, or the
+# format of the pools, changes
+CACHE_VERSION = 1
+
+# Prefix of the directories of the pools being written
+TMP_PREFIX = "tmp-"
+
+
+class RulePoolCache:
+    """
+    On-disk cache of evaluated rule pools, keyed by a fingerprint of the
+    data and of the configuration of the rules generator.
+
+    Each pool is a directory holding the bounds of the rules, their
+    statistics, their packed activations and the bins they were evaluated
+    on. The total size of the cache is bounded: the least recently used
+    pools are removed first.
+    """
+
+    def __init__(self, path: str, max_size: float = 2 ** 30):
+        """
+        Parameters
+        ----------
+        path: directory of the cache
+        max_size: maximal size of the cache in bytes
+        """
+        self.path = path
+        self.max_size = max_size
+
+    @staticmethod
+    def get_key(xs: np.ndarray, y: np.ndarray, params: dict) -> str:
+        sha = hashlib.sha1(("%d-" % CACHE_VERSION).encode())
+        sha.update(json.dumps(params, sort_keys=True).encode())
+        for values in [xs, y]:
+            values = np.ascontiguousarray(values)
+            sha.update(("%s-%s" % (values.dtype.str, values.shape)).encode())
+            flat = values.reshape(-1).view(np.uint8)
+            for start in range(0, len(flat), HASH_BLOCK_SIZE):
+                sha.update(flat[start: start + HASH_BLOCK_SIZE])
+        return sha.hexdigest()
+
+    def load(self, key: str) -> Union[dict, None]:
+        """
+        Returns the arrays of a cached pool, None if it is not cached.
+        """
+        path = join(self.path, key)
+        if not exists(join(path, "pool.npz")):
+            return None
+        try:
+            # Marks the pool as recently used
+            os.utime(path)
+            with np.load(join(path, "pool.npz")) as arrays:
+                pool = dict(arrays)
+            with open(join(path, "bins.pkl"), "rb") as f:
+                pool["bins"] = pickle.load(f)
+        except OSError:
+            # Evicted by another process meanwhile
+            return None
+        return pool
+
+    def store(self, key: str, pool: dict):
+        """
+        Writes a pool, given as a dict of arrays and its bins,
+        then evicts the least recently used pools beyond max_size.
+        The pool is written in a private directory, then renamed. If another
+        process has stored the same pool meanwhile, its pool is kept.
+        """
+        path = join(self.path, key)
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=TMP_PREFIX, dir=self.path)
+        arrays = {name: values for name, values in pool.items() if name != "bins"}
+        np.savez(join(tmp_path, "pool.npz"), **arrays)
+        with open(join(tmp_path, "bins.pkl"), "wb") as f:
+            pickle.dump(pool.get("bins"), f)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process has stored the same pool first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not exists(join(path, "pool.npz")):
+                raise
+        self.evict(keep=key)
+
+    def evict(self, keep: str = None):
+        entries = []
+        for name in os.listdir(self.path):
+            path = join(self.path, name)
+            if name.startswith(TMP_PREFIX) or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(getsize(join(path, file)) for file in os.listdir(path))
+                entries.append((os.stat(path).st_mtime, name, size))
+            except OSError:
+                # Evicted by another process
+                continue
+        total_size = sum(size for _, _, size in entries)
+        for _, name, size in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(join(self.path, name), ignore_errors=True)
+            total_size -= size
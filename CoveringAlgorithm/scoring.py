@@ -0,0 +1,140 @@
+from typing import List, Tuple
+import numpy as np
+
+from .CA import CA
+from . import covering_tools as ct
+from . import functions as f
+
+
+class ScoringEngine:
+    """
+    Joint scoring of several fitted CA on the same inputs.
+
+    The selected rules of all the models are split into elementary
+    conditions, a feature being in a closed interval, which are deduplicated
+    across the models and rules. For each batch, every distinct condition is
+    evaluated once, every distinct rule is the AND of its conditions, and
+    the predictions of each model are looked up in the cells of its
+    prediction index from the activations of its rules, as PredictionIndex
+    does.
+    """
+
+    def __init__(self, models: List[CA]):
+        """
+        Parameters
+        ----------
+        models: fitted covering algorithms, with the same features
+        """
+        if len(models) == 0:
+            raise ValueError("At least one model is needed.")
+        for model in models:
+            f.check_is_fitted(model)
+            if len(model.features) != len(models[0].features):
+                raise ValueError("All the models must have the same number of features.")
+        self.models = models
+        self.nb_features = len(models[0].features)
+        # Bins of the models evaluated on integer codes, by id
+        self.bins = {}
+        self.conditions = {}
+        self.rules = {}
+        # For each model, the rules and the index of each target
+        self.targets = []
+        for model in models:
+            if model.n_targets is None:
+                selected = [(model.selected_rs, model.prediction_index)]
+            else:
+                selected = list(zip(model.selected_rs, model.prediction_index))
+            self.targets.append(
+                [(self.add_rules(rs, model.bins), index) for rs, index in selected]
+            )
+
+    def add_condition(self, key: Tuple) -> int:
+        return self.conditions.setdefault(key, len(self.conditions))
+
+    def add_rules(self, rules_list, bins: ct.FeatureBins = None) -> List[int]:
+        """
+        Registers the conditions of the rules and returns their ids.
+        """
+        if bins is None:
+            bins_id = None
+        else:
+            bins_id = id(bins)
+            self.bins[bins_id] = bins
+        rules_ids = []
+        for rule in rules_list:
+            if bins is None:
+                condition = rule.condition
+                bounds = zip(condition.features_indexes, condition.bmins, condition.bmaxs)
+            else:
+                bounds = zip(*bins.get_bounds(rule))
+            conditions_ids = tuple(
+                sorted(
+                    self.add_condition((bins_id, int(j), float(low), float(high)))
+                    for j, low, high in bounds
+                )
+            )
+            rules_ids.append(self.rules.setdefault(conditions_ids, len(self.rules)))
+        return rules_ids
+
+    def eval_conditions(self, xs: np.ndarray) -> np.ndarray:
+        """
+        Returns the activations of the distinct conditions, of shape
+        (n_samples, n_conditions), evaluating together the conditions on
+        the same feature.
+        """
+        groups = {}
+        for (bins_id, j, low, high), condition_id in self.conditions.items():
+            groups.setdefault((bins_id, j), []).append((condition_id, low, high))
+        binned = {bins_id: bins.transform(xs) for bins_id, bins in self.bins.items()}
+
+        activations = np.zeros((xs.shape[0], len(self.conditions)), dtype=bool)
+        for (bins_id, j), group in groups.items():
+            ids, lows, highs = map(np.array, zip(*group))
+            if bins_id is None:
+                values = xs[:, j]
+                valid = np.isfinite(values)
+            else:
+                values = binned[bins_id][:, j]
+                valid = values != self.bins[bins_id].missing_bin
+            values = values[:, None]
+            activations[:, ids] = (values >= lows) & (values <= highs) & valid[:, None]
+        return activations
+
+    def eval_rules(self, xs: np.ndarray) -> np.ndarray:
+        conditions_acts = self.eval_conditions(xs)
+        activations = np.ones((xs.shape[0], len(self.rules)), dtype=bool)
+        for conditions_ids, rule_id in self.rules.items():
+            for condition_id in conditions_ids:
+                activations[:, rule_id] &= conditions_acts[:, condition_id]
+        return activations
+
+    def predict(self, xs: np.ndarray) -> List[np.ndarray]:
+        """
+        Returns the predictions of each model, as CA.predict.
+        """
+        xs = np.asarray(xs, dtype=float)
+        if xs.shape[1] != self.nb_features:
+            raise ValueError(
+                "Number of features of the models must "
+                "match the input. Models n_features is %s and "
+                "input n_features is %s " % (self.nb_features, xs.shape[1])
+            )
+        activations = self.eval_rules(xs)
+        predictions = []
+        for model, targets in zip(self.models, self.targets):
+            targets_predictions = []
+            for rules_ids, index in targets:
+                signatures = np.packbits(activations[:, rules_ids], axis=1)
+                targets_predictions.append(
+                    np.array(
+                        [
+                            index.cells.get(signature.tobytes(), index.default)
+                            for signature in signatures
+                        ]
+                    )
+                )
+            if model.n_targets is None:
+                predictions.append(targets_predictions[0])
+            else:
+                predictions.append(np.column_stack(targets_predictions))
+        return predictions
@@ -0,0 +1,208 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+import numpy as np
+
+from .CA import CA
+from . import functions as f
+
+STATUS_MESSAGES = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+class PredictionServer:
+    """
+    Asynchronous server of the predictions of a fitted CA.
+
+    Concurrent requests are coalesced into micro-batches of at most
+    max_batch_size rows, waiting at most max_latency seconds after the first
+    row of a batch. Each batch goes through CA.predict in a worker thread,
+    outside of the event loop. If a batch fails, its requests are predicted
+    one by one, so that a failing request does not fail the others.
+    """
+
+    def __init__(self, model: CA, max_batch_size: int = 64, max_latency: float = 0.005):
+        """
+        Parameters
+        ----------
+        model: fitted covering algorithm
+        max_batch_size: maximal number of rows predicted together
+        max_latency: maximal waiting time, in seconds, of the first row of a batch
+        """
+        f.check_is_fitted(model)
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be positive.")
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.queue = None
+        self.server = None
+        self.batch_task = None
+        self.batch = []
+        # A single worker: the cells of the model are shared between calls
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def predict(self, rows: List[List[float]]) -> list:
+        """
+        Returns the predictions of the given rows, computed in the
+        micro-batches of the server.
+        """
+        if self.queue is None:
+            raise RuntimeError("The server is not started. Call 'start' first.")
+        # Malformed rows are rejected before being batched with other requests
+        n_features = len(self.model.features)
+        for row in rows:
+            if len(row) != n_features:
+                raise ValueError(
+                    "Each row must have %d features, not %d." % (n_features, len(row))
+                )
+        if len(rows) == 0:
+            return []
+        rows = np.array(rows, dtype=float).reshape(len(rows), n_features)
+        loop = asyncio.get_running_loop()
+        request = loop.create_future()
+        await self.queue.put((rows, request))
+        return list(await request)
+
+    async def get_batch(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        """
+        Returns the requests of the next batch. A request is never split,
+        a batch holds at least one request and at most max_batch_size rows
+        otherwise.
+        """
+        batch = [await self.queue.get()]
+        nb_rows = len(batch[0][0])
+        deadline = asyncio.get_running_loop().time() + self.max_latency
+        while nb_rows < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            nb_rows += len(request[0])
+        return batch
+
+    async def run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.get_batch()
+            self.batch = batch
+            try:
+                xs = np.concatenate([rows for rows, _ in batch])
+                predictions = await loop.run_in_executor(
+                    self.executor, self.model.predict, xs
+                )
+            except Exception:
+                # The failure is isolated: each request is predicted alone
+                for rows, future in batch:
+                    await self.predict_request(rows, future)
+            else:
+                start = 0
+                for rows, future in batch:
+                    stop = start + len(rows)
+                    if not future.done():
+                        future.set_result(predictions[start:stop].tolist())
+                    start = stop
+            self.batch = []
+
+    async def predict_request(self, rows: np.ndarray, future: asyncio.Future):
+        loop = asyncio.get_running_loop()
+        try:
+            predictions = await loop.run_in_executor(self.executor, self.model.predict, rows)
+        except Exception as error:
+            if not future.done():
+                future.set_exception(error)
+        else:
+            if not future.done():
+                future.set_result(np.asarray(predictions).tolist())
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Answers a HTTP request. POST /predict expects a JSON body
+        {"rows": [[x_1, ..., x_d], ...]} and returns {"predictions": [...]}.
+        """
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if line == "":
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            if len(request_line) < 2:
+                status, answer = 400, {"error": "Malformed request."}
+            elif request_line[0] == "GET" and request_line[1] == "/health":
+                status, answer = 200, {"status": "ok"}
+            elif request_line[0] == "POST" and request_line[1] == "/predict":
+                try:
+                    rows = json.loads(body)["rows"]
+                    status, answer = 200, {"predictions": await self.predict(rows)}
+                except (ValueError, KeyError, TypeError) as error:
+                    status, answer = 400, {"error": str(error)}
+            else:
+                status, answer = 404, {"error": "Unknown endpoint."}
+        except Exception as error:
+            status, answer = 500, {"error": str(error)}
+
+        content = json.dumps(answer).encode()
+        writer.write(
+            (
+                "HTTP/1.1 %d %s\r\n"
+                "Content-Type: application/json\r\n"
+                "Content-Length: %d\r\n"
+                "Connection: close\r\n\r\n" % (status, STATUS_MESSAGES[status], len(content))
+            ).encode("latin-1")
+            + content
+        )
+        await writer.drain()
+        writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        self.queue = asyncio.Queue()
+        self.batch_task = asyncio.ensure_future(self.run_batches())
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.batch_task is not None:
+            self.batch_task.cancel()
+        # The requests still waiting would never be answered
+        pending = list(self.batch)
+        if self.queue is not None:
+            while not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("The server is stopped."))
+        self.batch = []
+        self.server = None
+        self.batch_task = None
+        self.queue = None
+
+    def run(self, host: str = "127.0.0.1", port: int = 8080):
+        """
+        Serves the predictions until interrupted.
+        """
+
+        async def serve():
+            server = await self.start(host, port)
+            try:
+                await server.serve_forever()
+            finally:
+                await self.stop()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.executor.shutdown()
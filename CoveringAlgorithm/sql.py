@@ -0,0 +1,160 @@
+from typing import List, Tuple
+import numpy as np
+
+from .CA import CA
+from . import covering_tools as ct
+from . import functions as f
+
+
+def quote(name: str) -> str:
+    return '"%s"' % str(name).replace('"', '""')
+
+
+def to_literal(value: float) -> str:
+    # repr gives the shortest decimal converted back to the same double
+    return repr(float(value))
+
+
+def get_intervals(rule, bins: ct.FeatureBins = None) -> List[Tuple]:
+    """
+    Returns the intervals of the condition of a rule on the raw values,
+    as (feature, lower, lower_strict, upper, upper_strict).
+    """
+    if bins is None:
+        condition = rule.condition
+        return [
+            (j, bmin, False, bmax, False)
+            for j, bmin, bmax in zip(condition.features_indexes, condition.bmins, condition.bmaxs)
+        ]
+    return [(j,) + bins.get_interval(j, low, high) for j, low, high in zip(*bins.get_bounds(rule))]
+
+
+def rule_predicate(rule, columns: List[str], bins: ct.FeatureBins = None) -> str:
+    """
+    Returns the SQL predicate of the activation of a rule. A missing
+    value (NULL) makes it false, as in PredictionIndex.
+    """
+    terms = []
+    for j, lower, lower_strict, upper, upper_strict in get_intervals(rule, bins):
+        column = quote(columns[j])
+        terms.append("%s IS NOT NULL" % column)
+        if lower is not None:
+            terms.append("%s %s %s" % (column, ">" if lower_strict else ">=", to_literal(lower)))
+        if upper is not None:
+            terms.append("%s %s %s" % (column, "<" if upper_strict else "<=", to_literal(upper)))
+    if len(terms) == 0:
+        return "1 = 1"
+    return " AND ".join(terms)
+
+
+def get_cells(index: ct.PredictionIndex) -> List[Tuple[str, float]]:
+    """
+    Returns the cells of a prediction index as (signature, mean), the
+    signature being the string of the activations of the rules.
+    """
+    cells = []
+    for signature, mean in index.cells.items():
+        bits = np.unpackbits(np.frombuffer(signature, dtype=np.uint8))[: index.nb_rules]
+        cells.append(("".join(map(str, bits)), mean))
+    return sorted(cells)
+
+
+def get_model_parts(model: CA, target: int = None):
+    f.check_is_fitted(model)
+    if model.n_targets is None:
+        if target is not None:
+            raise ValueError("The model has a single target.")
+        return list(model.selected_rs), model.prediction_index
+    if target is None:
+        raise ValueError("The target of a multi-target model must be given.")
+    return list(model.selected_rs[target]), model.prediction_index[target]
+
+
+def export_cells_table(model: CA, cells_table: str, target: int = None) -> List[str]:
+    """
+    Returns the SQL statements creating the table of the cells of a
+    fitted CA, of columns (signature, prediction).
+    """
+    _, index = get_model_parts(model, target)
+    statements = [
+        "CREATE TABLE %s (signature TEXT PRIMARY KEY, prediction REAL NOT NULL)"
+        % quote(cells_table)
+    ]
+    statements += [
+        "INSERT INTO %s VALUES ('%s', %s)" % (quote(cells_table), signature, to_literal(mean))
+        for signature, mean in get_cells(index)
+    ]
+    return statements
+
+
+def export_sql(
+    model: CA,
+    table: str,
+    columns: List[str] = None,
+    key: str = None,
+    target: int = None,
+    cells_table: str = None,
+) -> str:
+    """
+    Returns a SQL query computing the predictions of a fitted CA on the
+    rows of a table, as CA.predict does.
+
+    The signature of a row is the string of the activations of the selected
+    rules, and its prediction the conditional mean of its training cell,
+    or the mean of y if no rule is active or the cell is empty.
+    Parameters
+    ----------
+    model : fitted covering algorithm
+    table : name of the table of the inputs
+    columns : name of the columns of the features, by default model.features
+    key : column identifying the rows, returned with the predictions
+    target : index of the target of a multi-target model
+    cells_table : table of the cells created by export_cells_table, by
+                  default the cells are written in the query
+    Returns
+    -------
+    query : the SQL query, returning a column prediction
+    """
+    rules_list, index = get_model_parts(model, target)
+    if columns is None:
+        columns = model.features
+    if len(columns) != len(model.features):
+        raise ValueError(
+            "Number of features of the model must "
+            "match the columns. Model n_features is %s and "
+            "number of columns is %s " % (len(model.features), len(columns))
+        )
+    default = to_literal(index.default)
+    selected = [] if key is None else ["s.%s" % quote(key)]
+
+    if len(rules_list) == 0:
+        selected.append("%s AS prediction" % default)
+        return "SELECT %s FROM %s AS s" % (", ".join(selected), quote(table))
+
+    signature = " || ".join(
+        "(CASE WHEN %s THEN '1' ELSE '0' END)" % rule_predicate(rule, columns, model.bins)
+        for rule in rules_list
+    )
+    inner = "SELECT %s%s AS signature FROM %s" % (
+        "" if key is None else quote(key) + ", ",
+        signature,
+        quote(table),
+    )
+    if cells_table is None:
+        cells = get_cells(index)
+        if len(cells) == 0:
+            prediction = default
+        else:
+            prediction = "CASE s.signature %s ELSE %s END" % (
+                " ".join("WHEN '%s' THEN %s" % (sign, to_literal(mean)) for sign, mean in cells),
+                default,
+            )
+        selected.append("%s AS prediction" % prediction)
+        return "SELECT %s FROM (%s) AS s" % (", ".join(selected), inner)
+
+    selected.append("COALESCE(c.prediction, %s) AS prediction" % default)
+    return "SELECT %s FROM (%s) AS s LEFT JOIN %s AS c ON c.signature = s.signature" % (
+        ", ".join(selected),
+        inner,
+        quote(cells_table),
+    )
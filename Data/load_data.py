@@ -1,4 +1,10 @@
-from os.path import dirname, join
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from os.path import dirname, join, exists
+import numpy as np
 import pandas as pd
 
 target_dict = {
@@ -17,8 +23,27 @@ target_dict = {
     "diabetes": "Y",
 }
 
+# Source files of each data set, relative to the racine path
+source_dict = {
+    "student_mat": ["Student/student-mat.csv"],
+    "student_por": ["Student/student-por.csv"],
+    "student_mat_easy": ["Student/student-mat.csv"],
+    "student_por_easy": ["Student/student-por.csv"],
+    "bike_hour": ["BikeSharing/hour.csv"],
+    "bike_day": ["BikeSharing/day.csv"],
+    "mpg": ["MPG/mpg.csv"],
+    "machine": ["Machine/machine.csv"],
+    "abalone": ["Abalone/abalone.csv"],
+    "prostate": ["Prostate/prostate.csv"],
+    "ozone": ["Ozone/ozone.csv"],
+    "diabetes": ["Diabetes/diabetes.csv"],
+}
+
+# To increment when the preparation of the data sets changes
+CACHE_VERSION = 1
+
 
-def load_data(name: str, racine_path: str = None):
+def read_data(name: str, racine_path: str):
     """
     Parameters
     ----------
@@ -27,10 +52,8 @@ def load_data(name: str, racine_path: str = None):
 
     Returns
     -------
-    data: a pandas DataFrame
+    data: a pandas DataFrame prepared from the source files
     """
-    if racine_path is None:
-        racine_path = dirname(__file__)
     if "student" in name:
         if "student_por" in name:
             data = pd.read_csv(join(racine_path, "Student/student-por.csv"), sep=";")
@@ -40,13 +63,15 @@ def load_data(name: str, racine_path: str = None):
             raise ValueError("Not tested dataset")
         # Covering Algorithm allow only numerical features.
         # We can only convert binary qualitative features.
-        data["sex"] = [1 if x == "F" else 0 for x in data["sex"].values]
-        data["Pstatus"] = [1 if x == "A" else 0 for x in data["Pstatus"].values]
-        data["famsize"] = [1 if x == "GT3" else 0 for x in data["famsize"].values]
-        data["address"] = [1 if x == "U" else 0 for x in data["address"].values]
-        data["school"] = [1 if x == "GP" else 0 for x in data["school"].values]
-        data = data.replace("yes", 1)
-        data = data.replace("no", 0)
+        data["sex"] = (data["sex"] == "F").astype(int)
+        data["Pstatus"] = (data["Pstatus"] == "A").astype(int)
+        data["famsize"] = (data["famsize"] == "GT3").astype(int)
+        data["address"] = (data["address"] == "U").astype(int)
+        data["school"] = (data["school"] == "GP").astype(int)
+        for col in data.columns[data.dtypes == object]:
+            values = data[col]
+            if values.isin(["yes", "no"]).all():
+                data[col] = (values == "yes").astype(int)
 
         if "easy" not in name:
             # For an harder exercise drop G1 and G2
@@ -80,3 +105,105 @@ def load_data(name: str, racine_path: str = None):
         raise ValueError("Not tested dataset")
 
     return data.dropna()
+
+
+def get_cache_key(name: str, racine_path: str) -> str:
+    sha = hashlib.sha1(("%s-%d" % (name, CACHE_VERSION)).encode())
+    for source in source_dict[name]:
+        with open(join(racine_path, source), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def to_storable(values: np.ndarray) -> np.ndarray:
+    # Object arrays can not be memory-mapped, strings are stored with a fixed width
+    if values.dtype == object:
+        return values.astype(str)
+    return values
+
+
+# Prefix of the directories of the caches being written
+TMP_PREFIX = "tmp-"
+
+
+def write_cache(data: pd.DataFrame, path: str):
+    """
+    Stores each column and the index of a DataFrame in a .npy file.
+    The cache is written in a private directory, then renamed. If another
+    process has written the same cache meanwhile, its cache is kept.
+    """
+    tmp_path = tempfile.mkdtemp(prefix=TMP_PREFIX, dir=dirname(path))
+    meta = {
+        "columns": [str(col) for col in data.columns],
+        "index_name": data.index.name,
+    }
+    for i, col in enumerate(data.columns):
+        np.save(join(tmp_path, "col_%d.npy" % i), to_storable(data[col].values))
+    np.save(join(tmp_path, "index.npy"), to_storable(data.index.values))
+    with open(join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another process has written the same cache first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not exists(join(path, "meta.json")):
+            raise
+
+
+def read_cache(path: str) -> pd.DataFrame:
+    """
+    Loads a cached DataFrame, its columns being memory-mapped copy-on-write:
+    the DataFrame can be modified, without changing the cache.
+    """
+    with open(join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    columns = {
+        col: np.load(join(path, "col_%d.npy" % i), mmap_mode="c")
+        for i, col in enumerate(meta["columns"])
+    }
+    index = pd.Index(np.load(join(path, "index.npy"), mmap_mode="c"), name=meta["index_name"])
+    return pd.DataFrame(columns, index=index, columns=meta["columns"], copy=False)
+
+
+def load_data(name: str, racine_path: str = None, cache_path: str = None, use_cache: bool = True):
+    """
+    Parameters
+    ----------
+    name: a chosen data set
+    racine_path : the racine path
+    cache_path : directory of the binary cache, by default racine_path/.cache
+    use_cache : to store the prepared data set in a binary cache, rebuilt
+                when its source files change
+
+    Returns
+    -------
+    data: a pandas DataFrame
+    """
+    if racine_path is None:
+        racine_path = dirname(__file__)
+    if not use_cache or name not in source_dict:
+        return read_data(name, racine_path)
+
+    if cache_path is None:
+        cache_path = join(racine_path, ".cache")
+    key = get_cache_key(name, racine_path)
+    path = join(cache_path, name + "-" + key)
+    if not exists(join(path, "meta.json")):
+        data = read_data(name, racine_path)
+        try:
+            os.makedirs(cache_path, exist_ok=True)
+            # Removes the caches of the previous versions of the sources,
+            # not the ones being written by other processes
+            for old_path in os.listdir(cache_path):
+                if old_path.startswith(TMP_PREFIX):
+                    continue
+                old_name, _, old_key = old_path.rpartition("-")
+                if old_name == name and old_key != key:
+                    shutil.rmtree(join(cache_path, old_path), ignore_errors=True)
+            write_cache(data, path)
+        except OSError:
+            # E.g. read-only data directory, the data is not cached
+            return data
+    return read_cache(path)
@@ -0,0 +1,475 @@
+# coding: utf-8
+# # Parallel and resumable runner of the experiments
+import hashlib
+import json
+import math
+import os
+import subprocess
+import tempfile
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os.path import dirname, join, exists
+from typing import List
+import numpy as np
+import pandas as pd
+
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.ensemble import (
+    RandomForestRegressor,
+    GradientBoostingRegressor,
+    AdaBoostRegressor,
+)
+from sklearn.tree import DecisionTreeRegressor
+
+import rulefit
+
+import CoveringAlgorithm.CA as CA
+import CoveringAlgorithm.covering_tools as ct
+from CoveringAlgorithm.functions import (
+    make_rs_from_r,
+    extract_rules_rulefit,
+    calc_coverage_rate,
+    extract_rules_from_trees,
+)
+from Data.load_data import load_data, target_dict
+from ruleskit import RuleSet
+
+racine_path = dirname(__file__)
+r_script = "/usr/bin/Rscript"
+
+Job = namedtuple("Job", ["dataset", "simu", "algorithm"])
+
+# Jobs producing the results of several algorithms
+JOB_OUTPUTS = {"R": ["Sirus", "NH"]}
+
+DEFAULT_PARAMS = {
+    "seed": 42,
+    "test_size": 0.3,
+    "alpha": 1.0 / 2 - 1.0 / 100,
+    "gamma": 0.90,
+    "lmax": 3,
+    "tree_size": 2 ** 3,
+    "max_rules": 4000,
+    "learning_rate": 0.1,
+    "rf_estimators": 1000,
+}
+
+
+def make_jobs(datasets: List[str], nb_simu: int, algorithms: List[str]) -> List[Job]:
+    return [
+        Job(dataset, simu, algorithm)
+        for dataset in datasets
+        for simu in range(nb_simu)
+        for algorithm in algorithms
+    ]
+
+
+def get_seed(base_seed: int, *keys) -> int:
+    """
+    Deterministic seed of a job, independent of the execution order.
+    """
+    key = "-".join(str(k) for k in keys)
+    return (base_seed + zlib.crc32(key.encode())) % (2 ** 31)
+
+
+def get_params_key(params: dict) -> str:
+    """
+    Short hash of the parameters of an experiment, so that the results of
+    other parameters are never taken for its own.
+    """
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:10]
+
+
+class ResultsStore:
+    """
+    On-disk store of the metrics of the jobs, one JSON file per
+    algorithm, per job and per parameters of the experiment.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def get_file(self, dataset: str, simu: int, algorithm: str, params_key: str) -> str:
+        return join(self.path, "%s__%d__%s__%s.json" % (dataset, simu, algorithm, params_key))
+
+    def is_done(self, job: Job, params_key: str) -> bool:
+        return all(
+            exists(self.get_file(job.dataset, job.simu, name, params_key))
+            for name in JOB_OUTPUTS.get(job.algorithm, [job.algorithm])
+        )
+
+    def save(self, job: Job, results: dict, params: dict, params_key: str):
+        """
+        Saves the metrics of a job, with the parameters it was run with.
+        """
+        for name, metrics in results.items():
+            file = self.get_file(job.dataset, job.simu, name, params_key)
+            record = dict(
+                dataset=job.dataset,
+                simu=job.simu,
+                algorithm=name,
+                params_key=params_key,
+                params=params,
+                **metrics
+            )
+            # Written in a temporary file first, so a crash never leaves a partial result
+            with open(file + ".tmp", "w") as f:
+                json.dump(record, f)
+            os.replace(file + ".tmp", file)
+
+    def get_tuned_file(self, dataset: str, name: str, params_key: str) -> str:
+        # Not a .json file, so that it is not read as a result
+        return join(self.path, "%s__%s__%s.tuned" % (dataset, name, params_key))
+
+    def load_tuned(self, dataset: str, name: str, params_key: str):
+        """
+        Returns a parameter tuned once per dataset, None if not tuned yet.
+        """
+        file = self.get_tuned_file(dataset, name, params_key)
+        if not exists(file):
+            return None
+        with open(file, "r") as f:
+            return json.load(f)
+
+    def save_tuned(self, dataset: str, name: str, params_key: str, value):
+        file = self.get_tuned_file(dataset, name, params_key)
+        with open(file + ".tmp", "w") as f:
+            json.dump(value, f)
+        os.replace(file + ".tmp", file)
+
+    def to_frame(self, params_key: str = None) -> pd.DataFrame:
+        """
+        Returns the results of the store, only the ones of the given
+        parameters if params_key is given.
+        """
+        records = []
+        for file in sorted(os.listdir(self.path)):
+            if not file.endswith(".json"):
+                continue
+            if params_key is not None and not file.endswith("__%s.json" % params_key):
+                continue
+            with open(join(self.path, file), "r") as f:
+                records.append(json.load(f))
+        return pd.DataFrame(records)
+
+
+def make_artificial_data(seed: int, n_rows: int = 5000, n_rows_test: int = 50000, n_cols: int = 100):
+    rng = np.random.RandomState(seed)
+
+    def make_y_true(x):
+        return (
+            9
+            * np.exp(-3 * (1 - x[:, 0]) ** 2)
+            * np.exp(-3 * (1 - x[:, 1]) ** 2)
+            * np.exp(-3 * (1 - x[:, 2]) ** 2)
+            - 0.8 * np.exp(-2 * (x[:, 3] - x[:, 4]))
+            + 2 * np.sin(math.pi * x[:, 5]) ** 2
+            - 2.5 * (x[:, 6] - x[:, 7])
+        )
+
+    x_train = rng.randint(10, size=(n_rows, n_cols)) / 10.0
+    y_true = make_y_true(x_train)
+    sigma2 = 1 / 4.0 * np.var(y_true)  # two-to-one signal-to-noise ratio
+    y_train = y_true + rng.normal(0, sigma2, n_rows)
+
+    x_test = rng.randint(10, size=(n_rows_test, n_cols)) / 10.0
+    y_true_test = make_y_true(x_test)
+    sigma2_2 = 1 / 4.0 * np.var(y_true_test)
+    y_test = y_true_test + rng.normal(0, sigma2_2, n_rows_test)
+
+    features = ["X" + str(j) for j in range(1, n_cols + 1)]
+    return x_train, x_test, y_train, y_test, y_true_test, features
+
+
+def get_data(dataset: str, simu: int, params: dict) -> dict:
+    """
+    Returns the train and test sets of a simulation. They only depend on
+    the dataset and the simulation, so that all the algorithms of a
+    simulation are compared on the same data.
+    """
+    seed = get_seed(params["seed"], dataset, simu)
+    if dataset == "artificial":
+        x_train, x_test, y_train, y_test, y_true, features = make_artificial_data(seed)
+    else:
+        data = load_data(dataset)
+        target = target_dict[dataset]
+        y = data[target].astype("float")
+        x = data.drop(target, axis=1)
+        features = x.describe().columns
+        x = x[features]
+        x_train, x_test, y_train, y_test = train_test_split(
+            x, y, test_size=params["test_size"], random_state=seed
+        )
+        x_train, x_test = x_train.values, x_test.values
+        y_train, y_test = y_train.values, y_test.values
+        features = features.to_list()
+        y_true = None
+
+    return dict(
+        x_train=x_train,
+        x_test=x_test,
+        y_train=y_train,
+        y_test=y_test,
+        y_true=y_true,
+        features=features,
+    )
+
+
+def calc_metrics(rules, coverage: float, pred: np.ndarray, data: dict) -> dict:
+    y_test = data["y_test"]
+    deno_mse = np.mean((y_test - np.mean(y_test)) ** 2)
+    metrics = {
+        "rules": len(rules),
+        "coverage": float(coverage),
+        "interpretability": ct.interpretability_index(rules),
+        "r2": r2_score(y_test, pred),
+        "mse": np.mean((y_test - pred) ** 2) / deno_mse,
+    }
+    if data["y_true"] is not None:
+        y_true = data["y_true"]
+        deno_ytrue = np.mean((y_true - np.mean(y_true)) ** 2)
+        metrics["mse*"] = np.mean((y_true - pred) ** 2) / deno_ytrue
+    return {key: float(value) for key, value in metrics.items()}
+
+
+def run_tree_rules(algorithm: str, data: dict, seed: int, params: dict) -> dict:
+    x_train = data["x_train"]
+    if algorithm == "DT":
+        model = DecisionTreeRegressor(max_leaf_nodes=10, random_state=seed)
+        model.fit(x_train, data["y_train"])
+        trees = [model]
+    else:
+        model = RandomForestRegressor(n_estimators=params["rf_estimators"], random_state=seed)
+        model.fit(x_train, data["y_train"])
+        trees = model.estimators_
+
+    rules_list = extract_rules_from_trees(
+        trees,
+        xmins=x_train.min(axis=0),
+        xmaxs=x_train.max(axis=0),
+        features_names=data["features"],
+        get_leaf=True,
+    )
+    coverage = calc_coverage_rate(rules_list, x_train)
+    pred = model.predict(data["x_test"])
+    return {algorithm: calc_metrics(rules_list, coverage, pred, data)}
+
+
+def run_ca(algorithm: str, data: dict, seed: int, params: dict) -> dict:
+    n = data["x_train"].shape[0]
+    generators = {
+        "CA_RF": (RandomForestRegressor, 1.0),
+        "CA_GB": (GradientBoostingRegressor, 1.0),
+        "CA_SGB": (GradientBoostingRegressor, min(0.5, (100 + 6 * np.sqrt(n)) / n)),
+        "CA_AD": (AdaBoostRegressor, 1.0),
+    }
+    generator, subsample = generators[algorithm]
+    ca = CA.CA(
+        alpha=params["alpha"],
+        gamma=params["gamma"],
+        tree_size=params["tree_size"],
+        max_rules=params["max_rules"],
+        generator_func=generator,
+        lmax=params["lmax"],
+        learning_rate=params["learning_rate"],
+        subsample=subsample,
+        n_jobs=1,  # The jobs are already run in parallel
+        seed=seed,
+    )
+    ca.fit(xs=data["x_train"], y=data["y_train"], features=data["features"])
+    pred = ca.predict(data["x_test"])
+    metrics = calc_metrics(ca.selected_rs, ca.selected_rs.calc_coverage_rate(), pred, data)
+    counter = ca.selected_rs.get_variables_count()
+    metrics["variables"] = {str(key): int(value) for key, value in counter.items()}
+    return {algorithm: metrics}
+
+
+def run_rulefit(algorithm: str, data: dict, seed: int, params: dict) -> dict:
+    x_train = data["x_train"]
+    rule_fit = rulefit.RuleFit(
+        tree_size=params["tree_size"],
+        max_rules=params["max_rules"],
+        model_type="r",
+        random_state=seed,
+    )
+    rule_fit.fit(x_train, data["y_train"])
+    model = rule_fit.get_rules()
+    model = model[model.coef != 0].sort_values(by="support")
+    rules = model.loc[model["type"] == "rule"]
+    rulefit_rs = extract_rules_rulefit(
+        rules, data["features"], x_train.min(axis=0), x_train.max(axis=0)
+    )
+    coverage = calc_coverage_rate(rulefit_rs, x_train)
+    pred = rule_fit.predict(data["x_test"])
+    return {algorithm: calc_metrics(rulefit_rs, coverage, pred, data)}
+
+
+def call_r_script(path: str, data: dict, p0: float, seed: int, tune: bool = False):
+    """
+    Runs main.r on the data of a simulation, in the directory path.
+    With p0 equal to 0, p0 is cross-validated and written in p0.txt.
+    """
+    features = data["features"]
+    pathx = join(path, "X.csv")
+    pathy = join(path, "Y.csv")
+    pathx_test = join(path, "X_test.csv")
+    pd.DataFrame(data["x_train"], columns=features).to_csv(pathx, index=False)
+    pd.Series(data["y_train"]).to_csv(pathy, index=False, header=False)
+    pd.DataFrame(data["x_test"], columns=features).to_csv(pathx_test, index=False)
+
+    with open(join(path, "output_rfile.txt"), "w") as f:
+        subprocess.call(
+            [
+                r_script,
+                "--no-save",
+                "--no-restore",
+                "--verbose",
+                "--vanilla",
+                join(racine_path, "main.r"),
+                pathx,
+                pathy,
+                pathx_test,
+                repr(float(p0)),
+                str(seed),
+            ]
+            + (["tune"] if tune else []),
+            stdout=f,
+            stderr=subprocess.STDOUT,
+            cwd=path,
+        )
+
+
+def tune_p0(dataset: str, params: dict) -> float:
+    """
+    Cross-validates the p0 of SIRUS on the first simulation of a dataset,
+    as in the original protocol, to be shared by all its simulations.
+    """
+    data = get_data(dataset, 0, params)
+    with tempfile.TemporaryDirectory() as path:
+        call_r_script(path, data, 0, get_seed(params["seed"], dataset, "p0"), tune=True)
+        with open(join(path, "p0.txt"), "r") as f:
+            return float(f.readline().strip())
+
+
+def run_r(algorithm: str, data: dict, seed: int, params: dict) -> dict:
+    """
+    Runs SIRUS and NodeHarvest with main.r, in a directory of its own,
+    with the p0 tuned once for the dataset.
+    """
+    x_train = data["x_train"]
+    features = data["features"]
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        call_r_script(path, data, params["p0"], seed)
+        for name, prefix in [("Sirus", "sirus"), ("NH", "nh")]:
+            pred = pd.read_csv(join(path, prefix + "_pred.csv"))["x"].values
+            rules = pd.read_csv(join(path, prefix + "_rules.csv"))
+            rs = make_rs_from_r(
+                rules, features, x_train.min(axis=0), x_train.max(axis=0)
+            )
+            if name == "NH":
+                rs = RuleSet(rs[:-1])
+            coverage = calc_coverage_rate(rs, x_train)
+            results[name] = calc_metrics(rs, coverage, pred, data)
+    return results
+
+
+ALGORITHMS = {
+    "DT": run_tree_rules,
+    "RF": run_tree_rules,
+    "CA_RF": run_ca,
+    "CA_GB": run_ca,
+    "CA_SGB": run_ca,
+    "CA_AD": run_ca,
+    "RuleFit": run_rulefit,
+    "R": run_r,
+}
+
+
+def run_job(job: Job, params: dict, tuned: dict = None) -> dict:
+    """
+    Runs a job, tuned holding the parameters tuned once for its dataset.
+    """
+    import warnings
+
+    warnings.filterwarnings("ignore")
+    if tuned is not None:
+        params = dict(params, **tuned)
+    data = get_data(job.dataset, job.simu, params)
+    seed = get_seed(params["seed"], *job)
+    return ALGORITHMS[job.algorithm](job.algorithm, data, seed, params)
+
+
+def run_experiments(
+    jobs: List[Job], store: ResultsStore, n_jobs: int = None, **params
+) -> pd.DataFrame:
+    """
+    Runs the jobs which are not in the store yet on a pool of processes,
+    and saves the metrics of each job as soon as it is done.
+
+    Parameters
+    ----------
+    jobs: the (dataset, simulation, algorithm) to run
+    store: results store, completed jobs are skipped
+    n_jobs: number of processes, by default the number of CPUs
+    params: parameters overriding DEFAULT_PARAMS
+
+    Returns
+    -------
+    results: DataFrame of the results of the store for these parameters
+    """
+    for key in params:
+        if key not in DEFAULT_PARAMS:
+            raise ValueError("Unknown experiment parameter %s." % key)
+    params = dict(DEFAULT_PARAMS, **params)
+    for job in jobs:
+        if job.algorithm not in ALGORITHMS:
+            raise ValueError("Unknown algorithm %s." % job.algorithm)
+
+    params_key = get_params_key(params)
+    pending = [job for job in jobs if not store.is_done(job, params_key)]
+    print("%d jobs to run, %d already done." % (len(pending), len(jobs) - len(pending)))
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = {
+            executor.submit(run_job, job, params): (job, params)
+            for job in pending
+            if job.algorithm != "R"
+        }
+        # The p0 of SIRUS is tuned once per dataset and stored, the other
+        # jobs running meanwhile
+        tuned = {}
+        to_tune = {}
+        for dataset in sorted({job.dataset for job in pending if job.algorithm == "R"}):
+            p0 = store.load_tuned(dataset, "p0", params_key)
+            if p0 is None:
+                to_tune[executor.submit(tune_p0, dataset, params)] = dataset
+            else:
+                tuned[dataset] = {"p0": p0}
+        for future in as_completed(to_tune):
+            dataset = to_tune[future]
+            try:
+                p0 = future.result()
+            except Exception as error:
+                # Its R jobs are run again on restart
+                print("Tuning of p0 on %s failed: %r" % (dataset, error))
+                continue
+            store.save_tuned(dataset, "p0", params_key, p0)
+            tuned[dataset] = {"p0": p0}
+        for job in pending:
+            if job.algorithm == "R" and job.dataset in tuned:
+                job_params = dict(params, **tuned[job.dataset])
+                futures[executor.submit(run_job, job, params, tuned[job.dataset])] = (
+                    job,
+                    job_params,
+                )
+        for future in as_completed(futures):
+            job, job_params = futures[future]
+            try:
+                store.save(job, future.result(), job_params, params_key)
+            except Exception as error:
+                # The other jobs go on, the failed one is run again on restart
+                print("Job %s failed: %r" % (str(job), error))
+    return store.to_frame(params_key)
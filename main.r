@@ -6,6 +6,8 @@ pathy = args[2]
 pathx_test = args[3]
 p0 = as.double(args[4])
 seed = as.double(args[5])
+# With "tune", only the cross-validated p0 of SIRUS is computed
+tune_only = length(args) >= 6 && args[6] == "tune"
 
 X <- read.csv(file=pathx, header=TRUE, sep=",")
 y <- read.csv(file=pathy, header=FALSE, sep=",")
@@ -25,6 +27,7 @@ fileConn <- file("p0.txt")
 writeLines(toString(p0), fileConn)
 close(fileConn)
 }
+if(tune_only){quit(save="no")}
 sirus.m <- sirus.fit(X, y, max.depth=3, p0=p0, verbose=FALSE, seed=seed)
 
 sirus_nbrules = length(sirus.m$rules)
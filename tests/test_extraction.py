@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from CoveringAlgorithm import functions as f
+
+
+def make_tree():
+    """
+    x0 <= 0.8 ? (x0 <= 0.5 ? leaf : leaf) : (x1 <= 0.3 ? leaf : leaf)
+    """
+    tree_ = SimpleNamespace(
+        children_left=np.array([1, 2, -1, -1, 5, -1, -1]),
+        children_right=np.array([4, 3, -1, -1, 6, -1, -1]),
+        feature=np.array([0, 0, -2, -2, 1, -2, -2]),
+        threshold=np.array([0.8, 0.5, -2.0, -2.0, 0.3, -2.0, -2.0]),
+    )
+    return SimpleNamespace(tree_=tree_)
+
+
+# Nodes 1 to 6 in depth-first order, left child first
+EXPECTED_USED = np.array(
+    [
+        [True, False],
+        [True, False],
+        [True, False],
+        [True, False],
+        [True, True],
+        [True, True],
+    ]
+)
+EXPECTED_BMINS = np.array(
+    [[0.0, 0.0], [0.0, 0.0], [0.5, 0.0], [0.8, 0.0], [0.8, 0.0], [0.8, 0.3]]
+)
+# The right child of the second split on x0 keeps the upper bound 0.8
+EXPECTED_BMAXS = np.array(
+    [[0.8, 1.0], [0.5, 1.0], [0.8, 1.0], [1.0, 1.0], [1.0, 0.3], [1.0, 1.0]]
+)
+
+
+def test_extract_bounds_from_hand_built_tree():
+    used, bmins, bmaxs = f.extract_bounds_from_trees([make_tree()], [0.0, 0.0], [1.0, 1.0])
+    np.testing.assert_array_equal(used, EXPECTED_USED)
+    np.testing.assert_array_equal(np.where(used, bmins, np.nan), np.where(EXPECTED_USED, EXPECTED_BMINS, np.nan))
+    np.testing.assert_array_equal(np.where(used, bmaxs, np.nan), np.where(EXPECTED_USED, EXPECTED_BMAXS, np.nan))
+
+
+def test_extract_leaves_from_hand_built_tree():
+    used, bmins, bmaxs = f.extract_bounds_from_trees(
+        [make_tree(), make_tree()], [0.0, 0.0], [1.0, 1.0], get_leaf=True
+    )
+    leaves = [1, 2, 4, 5]
+    np.testing.assert_array_equal(used, np.vstack([EXPECTED_USED[leaves]] * 2))
+    np.testing.assert_array_equal(bmins[used], np.vstack([EXPECTED_BMINS[leaves]] * 2)[used])
+    np.testing.assert_array_equal(bmaxs[used], np.vstack([EXPECTED_BMAXS[leaves]] * 2)[used])
+
+
+def test_extract_rules_from_hand_built_tree():
+    rules_list = f.extract_rules_from_trees([make_tree()], [0.0, 0.0], [1.0, 1.0])
+    assert len(rules_list) == 6
+    condition = rules_list[2].condition
+    assert list(condition.features_indexes) == [0]
+    assert list(condition.bmins) == [0.5]
+    assert list(condition.bmaxs) == [0.8]
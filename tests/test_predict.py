@@ -0,0 +1,29 @@
+import numpy as np
+
+from CoveringAlgorithm.CA import CA
+from CoveringAlgorithm import covering_tools as ct
+
+
+def make_data(n: int):
+    rng = np.random.RandomState(0)
+    xs = rng.uniform(size=(n, 3))
+    y = 2 * (xs[:, 0] > 0.5) + xs[:, 1] + rng.normal(scale=0.1, size=n)
+    return xs, y
+
+
+def test_predict_without_rows():
+    xs, y = make_data(500)
+    model = CA(max_rules=50, n_jobs=1, seed=0).fit(xs, y)
+    assert model.predict(xs[:0]).shape == (0,)
+    assert ct.calc_prediction(model.selected_rs, y, xs[:0]).shape == (0,)
+
+    model = CA(max_rules=50, n_jobs=1, seed=0).fit(xs, np.column_stack([y, -y]))
+    assert model.predict(xs[:0]).shape == (0, 2)
+
+
+def test_prediction_index_matches_calc_prediction():
+    xs, y = make_data(500)
+    model = CA(max_rules=50, n_jobs=1, seed=0).fit(xs, y)
+    np.testing.assert_allclose(
+        model.predict(xs[:100]), ct.calc_prediction(model.selected_rs, y, xs[:100])
+    )
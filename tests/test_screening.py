@@ -0,0 +1,49 @@
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+
+from CoveringAlgorithm import covering_tools as ct
+from CoveringAlgorithm import functions as f
+
+
+def test_binomial_bounds_without_success():
+    log_term = np.log(6 * 4000 / 0.01)
+    low, up = ct.binomial_bounds(np.array([0.0]), 10000, log_term)
+    assert low[0] == 0
+    # 1 - exp(-log_term / size), about log_term / size
+    assert np.isclose(up[0], 1 - np.exp(-log_term / 10000), rtol=1e-6)
+
+
+def test_binomial_bounds_contain_rate():
+    counts = np.array([0.0, 3.0, 50.0, 5000.0, 10000.0])
+    low, up = ct.binomial_bounds(counts, 10000, 10.0)
+    rates = counts / 10000
+    assert np.all(low <= rates) and np.all(rates <= up)
+    # Never wider than the Hoeffding interval, and much narrower near 0 or 1
+    hoeffding_width = 2 * np.sqrt(10.0 / (2 * 10000))
+    assert np.all(up - low <= hoeffding_width)
+    assert np.all((up - low)[[0, 1, 4]] < hoeffding_width / 4)
+
+
+def test_screen_rules_discards_low_coverage_rules():
+    rng = np.random.RandomState(0)
+    n = 30000
+    xs = rng.uniform(size=(n, 5))
+    y = xs[:, 0] + np.sin(6 * xs[:, 1]) + rng.normal(scale=0.1, size=n)
+    generator = GradientBoostingRegressor(
+        n_estimators=100, max_leaf_nodes=8, max_depth=100, random_state=0
+    ).fit(xs, y)
+    rules_list = f.extract_rules_from_trees(
+        [tree[0] for tree in generator.estimators_], xs.min(axis=0), xs.max(axis=0)
+    )
+
+    kept = ct.screen_rules(rules_list, xs, y, seed=0)
+    kept_ids = {id(rule) for rule in kept}
+    cov_min = n ** (-(1 / 2 - 1 / 100))
+    coverages = np.array([ct.eval_activation(rule, xs).mean() for rule in rules_list])
+
+    discarded = [i for i, rule in enumerate(rules_list) if id(rule) not in kept_ids]
+    assert len(discarded) > 0
+    # The rules covering far too few points are discarded
+    low_coverage = np.flatnonzero(coverages <= cov_min / 4)
+    assert len(low_coverage) > 0
+    assert np.isin(low_coverage, discarded).mean() > 0.9
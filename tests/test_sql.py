@@ -0,0 +1,72 @@
+import sqlite3
+
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from CoveringAlgorithm.CA import CA
+from CoveringAlgorithm.sql import export_sql, export_cells_table
+
+
+def make_data(n: int, with_nan: bool = False):
+    rng = np.random.RandomState(0)
+    xs = rng.uniform(size=(n, 4))
+    y = 2 * (xs[:, 0] > 0.5) + xs[:, 1] + rng.normal(scale=0.1, size=n)
+    if with_nan:
+        xs[rng.uniform(size=n) < 0.1, 2] = np.nan
+    return xs, y
+
+
+def make_inputs(model: CA, xs: np.ndarray) -> np.ndarray:
+    """
+    Rows of the data with values on the bounds of the rules and missing values.
+    """
+    xs = xs.copy()
+    for k, rule in enumerate(list(model.selected_rs)[: len(xs) // 2]):
+        condition = rule.condition
+        xs[2 * k, condition.features_indexes[0]] = condition.bmins[0]
+        xs[2 * k + 1, condition.features_indexes[0]] = condition.bmaxs[0]
+    xs[::7, 0] = np.nan
+    xs[::11, 3] = np.nan
+    return xs
+
+
+def predict_sqlite(model: CA, xs: np.ndarray, cells_table: str = None) -> np.ndarray:
+    connection = sqlite3.connect(":memory:")
+    columns = ", ".join('"%s" REAL' % name for name in model.features)
+    connection.execute("CREATE TABLE inputs (row_id INTEGER PRIMARY KEY, %s)" % columns)
+    rows = [
+        (i,) + tuple(None if np.isnan(value) else float(value) for value in row)
+        for i, row in enumerate(xs)
+    ]
+    connection.executemany(
+        "INSERT INTO inputs VALUES (%s)" % ", ".join("?" * (xs.shape[1] + 1)), rows
+    )
+    if cells_table is not None:
+        for statement in export_cells_table(model, cells_table):
+            connection.execute(statement)
+    query = export_sql(model, "inputs", key="row_id", cells_table=cells_table)
+    predictions = dict(connection.execute(query).fetchall())
+    connection.close()
+    return np.array([predictions[i] for i in range(len(xs))])
+
+
+@pytest.mark.parametrize(
+    "params, with_nan",
+    [
+        ({}, False),
+        ({"quantize": True}, False),
+        ({"generator_func": HistGradientBoostingRegressor}, True),
+    ],
+)
+@pytest.mark.parametrize("cells_table", [None, "cells"])
+def test_export_sql_matches_predict(params, with_nan, cells_table):
+    xs, y = make_data(600, with_nan)
+    model = CA(max_rules=200, tree_size=4, n_jobs=1, seed=0, **params)
+    model.fit(xs, y)
+    assert len(model.selected_rs) > 0
+
+    inputs = make_inputs(model, xs[:300])
+    np.testing.assert_allclose(
+        predict_sqlite(model, inputs, cells_table), model.predict(inputs), rtol=1e-12
+    )